@@ -1,13 +1,25 @@
 import os
+import re
+import json
+import time
 import logging
-from typing import Dict, Any
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Any, AsyncIterator, FrozenSet, Optional, Tuple
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain.tools import StructuredTool
+from langchain_core.callbacks import BaseCallbackHandler
 
-from backend.mcp_client import MCPClient
+from backend.agents.memory import TokenBudgetMemory
+from backend.database import get_async_db_context
+from backend.mcp_client import MCPClient, tool_call_limit
+from backend.services.doctor_directory import doctor_directory
+from backend.services.metrics import AGENT_ITERATIONS, CHAT_TURN_SECONDS, LLM_CALL_SECONDS, LLM_TOKENS
+from backend.services.tracing import Span, span, start_span
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,88 +27,349 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class DoctorAppointmentAgent:
-    def __init__(self, role: str = "patient"):
-        self.mcp_client = MCPClient()
-        self.tools = self.mcp_client.get_langchain_tools()
-        self.role = role
+MODEL_NAME = "gemini-1.5-flash-latest"
+AGENT_FAST_PATH = os.getenv("AGENT_FAST_PATH", "true").lower() in ("1", "true", "yes")
 
-        if not os.getenv("GOOGLE_API_KEY"):
-            raise ValueError("GOOGLE_API_KEY not found in .env file. Please set it to run the agent.")
-
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash-latest",
-            temperature=0,
-            convert_system_message_to_human=True
+def _system_prompt(role: str) -> str:
+    if role == "patient":
+        return (
+            "You are a tool-using AI. Your only goal is to book doctor appointments by following these rules precisely. You MUST use your tools. Do not make up information.\n\n"
+            "*CRITICAL BEHAVIOR:*\n"
+            "1.  *Memory Rule:* You have a short-term memory. You MUST remember key information throughout the conversation: the patient_email, doctor_email from tools, and the reason for the appointment.\n"
+            "2.  *Execution Rule:* When you use the final book_appointment tool, you MUST use the exact values you remembered.\n"
+            "3.  *Cancellation Rule:* To cancel an appointment, ask for the appointment ID and the patient's email, then use the cancel_appointment tool.\n\n"
+            
+            "*WORKFLOW:*\n"
+            "1.  *Get Patient Email:* Ask the user for their email and wait for their response.\n"
+            "2.  *Get Specialty:* Ask the user for the medical specialty they need.\n"
+            "3.  *Find Doctor & REMEMBER Email:* Use the get_doctors_by_specialty tool. When it returns a doctor, you MUST find their email in the tool's output. Your next thought must be to explicitly state: 'I will remember this exact email for the final booking.'\n"
+            "4.  *Get Reason:* Ask the user for the reason/symptoms for their appointment (e.g., 'What's the reason for your visit?' or 'What symptoms are you experiencing?').\n"
+            "5.  *Check Availability:* Ask for a date and use the check_doctor_availability tool with the doctor's information. If the user wants the earliest possible appointment instead, use the find_next_available_slot tool.\n"
+            "6.  *Get Time Choice:* Present the list of available time strings from the tool's output and get the user's choice.\n"
+            "7.  *Confirm and Book:* Ask for final confirmation. Then, use the book_appointment tool with the exact patient_email, doctor_email, appointment time, and reason you collected."
         )
-
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="output"
+    else: 
+        return (
+            "PRIMARY DIRECTIVE: You are an informational AI assistant for doctors. Your only purpose is to use the provided tools to answer questions about appointments and patients. You have full permission to use all tools.\n\n"
+            
+            "RULES:\n"
+            "1.  You MUST use your tools to answer questions. Do not claim you cannot access information if a tool is available for it.\n"
+            "2.  If the user says 'today', you MUST understand that you should use the current date for the `target_date_str` parameter if the tool requires it. Do not ask the user for the date if they say 'today'.\n\n"
+            
+            "AVAILABLE TOOLS:\n"
+            "- `get_appointments_summary_for_doctor`: Use this to get a list of appointments for a specific doctor on a specific date.\n"
+            "- `get_appointments_report`: Use this for appointments over several days, for several doctors, or for a whole specialty.\n"
+            "- `get_patient_count_by_date`: Use this to count patients on a given date, for the whole clinic or for one doctor.\n"
+            "- `get_patients_with_condition`: Use this to find patients with a specific condition."
         )
-        self.agent_executor = self._create_agent_executor()
-        logger.info(f"Agent initialized for role: {self.role} with model gemini-1.5-flash-latest")
-
-    def _create_agent_executor(self) -> AgentExecutor:
-        if self.role == "patient":
-            system_prompt = (
-                "You are a tool-using AI. Your only goal is to book doctor appointments by following these rules precisely. You MUST use your tools. Do not make up information.\n\n"
-                "*CRITICAL BEHAVIOR:*\n"
-                "1.  *Memory Rule:* You have a short-term memory. You MUST remember key information throughout the conversation: the patient_email, doctor_email from tools, and the reason for the appointment.\n"
-                "2.  *Execution Rule:* When you use the final book_appointment tool, you MUST use the exact values you remembered.\n\n"
-                
-                "*WORKFLOW:*\n"
-                "1.  *Get Patient Email:* Ask the user for their email and wait for their response.\n"
-                "2.  *Get Specialty:* Ask the user for the medical specialty they need.\n"
-                "3.  *Find Doctor & REMEMBER Email:* Use the get_doctors_by_specialty tool. When it returns a doctor, you MUST find their email in the tool's output. Your next thought must be to explicitly state: 'I will remember this exact email for the final booking.'\n"
-                "4.  *Get Reason:* Ask the user for the reason/symptoms for their appointment (e.g., 'What's the reason for your visit?' or 'What symptoms are you experiencing?').\n"
-                "5.  *Check Availability:* Ask for a date and use the check_doctor_availability tool with the doctor's information.\n"
-                "6.  *Get Time Choice:* Present the list of available time strings from the tool's output and get the user's choice.\n"
-                "7.  *Confirm and Book:* Ask for final confirmation. Then, use the book_appointment tool with the exact patient_email, doctor_email, appointment time, and reason you collected."
-            )
-        else: 
-            system_prompt = (
-                "PRIMARY DIRECTIVE: You are an informational AI assistant for doctors. Your only purpose is to use the provided tools to answer questions about appointments and patients. You have full permission to use all tools.\n\n"
-                
-                "RULES:\n"
-                "1.  You MUST use your tools to answer questions. Do not claim you cannot access information if a tool is available for it.\n"
-                "2.  If the user says 'today', you MUST understand that you should use the current date for the `target_date_str` parameter if the tool requires it. Do not ask the user for the date if they say 'today'.\n\n"
-                
-                "AVAILABLE TOOLS:\n"
-                "- `get_appointments_summary_for_doctor`: Use this to get a list of appointments for a specific doctor on a specific date.\n"
-                "- `get_patient_count_by_date`: Use this to count patients on a given date.\n"
-                "- `get_patients_with_condition`: Use this to find patients with a specific condition."
-            )
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
+
+def _runtime_role(role: str) -> str:
+    return "patient" if role == "patient" else "doctor"
+
+@lru_cache(maxsize=None)
+def _shared_tools() -> Tuple[StructuredTool, ...]:
+    return tuple(MCPClient().get_langchain_tools())
+
+@lru_cache(maxsize=None)
+def _shared_llm() -> ChatGoogleGenerativeAI:
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise ValueError("GOOGLE_API_KEY not found in .env file. Please set it to run the agent.")
+    return ChatGoogleGenerativeAI(
+        model=MODEL_NAME,
+        temperature=0,
+        convert_system_message_to_human=True
+    )
+
+class AgentRuntime:
+    """The immutable, per-role part of an agent: LLM client, tools, prompt and executor."""
+    def __init__(self, role: str):
+        self.role = role
+        self.llm = _shared_llm()
+        self.tools = list(_shared_tools())
+        self.tools_by_name = {tool.name: tool for tool in self.tools}
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", _system_prompt(role) + "\n\n{memory_context}"),
             MessagesPlaceholder(variable_name="chat_history"),
             ("human", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
-
-        agent = create_tool_calling_agent(self.llm, self.tools, prompt)
-        
-        return AgentExecutor(
+        agent = create_tool_calling_agent(self.llm, self.tools, self.prompt)
+        self.agent_executor = AgentExecutor(
             agent=agent,
             tools=self.tools,
-            memory=self.memory,
             verbose=True,
             handle_parsing_errors=True,
-            max_iterations=10
+            max_iterations=10,
+            return_intermediate_steps=True
         )
+        logger.info(f"Agent runtime built for role: {self.role} with model {MODEL_NAME}")
+
+@lru_cache(maxsize=None)
+def _get_agent_runtime(runtime_role: str) -> AgentRuntime:
+    return AgentRuntime(runtime_role)
+
+def get_agent_runtime(role: str) -> AgentRuntime:
+    """Returns the process-wide runtime for a role, building it on first use."""
+    return _get_agent_runtime(_runtime_role(role))
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+def _preview(value: Any, limit: int = 500) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_ISO_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_WORD = re.compile(r"[a-z]+")
+
+# Words that can surround a structured request without changing what it asks for.
+_FILLER = frozenset(
+    "a all am an any are can check do doctor doctors dr email find for give have i is it like list looking me my need "
+    "of on please s see show specialist specialists tell the there to want we what whats when with would you".split()
+)
+_NEXT_SLOT_KEYS = frozenset({"next", "earliest", "first"})
+_NEXT_SLOT_WORDS = _NEXT_SLOT_KEYS | {"available", "slot", "appointment", "opening", "time"}
+_AVAILABILITY_KEYS = frozenset({"availability", "available", "openings", "slots", "free"})
+_AVAILABILITY_WORDS = _AVAILABILITY_KEYS | {"open", "times", "appointments"}
+_SUMMARY_KEYS = frozenset({"summary", "appointments", "schedule"})
+_SUMMARY_WORDS = _SUMMARY_KEYS | {"appointment", "daily"}
+_COUNT_WORDS = frozenset({"how", "many", "patients", "patient", "count", "number", "scheduled", "total"})
+
+@dataclass(frozen=True)
+class FastPath:
+    """A prompt the router can answer with a single tool call."""
+    tool: str
+    args: Dict[str, Any]
+
+def _specialty_names(specialty: str) -> FrozenSet[str]:
+    """Ways a patient may name a specialty: 'neurology', 'neurologist', 'neurologists'."""
+    name = specialty.lower()
+    names = {name, name + "s"}
+    if name.endswith("y"):
+        names.update({name[:-1] + "ist", name[:-1] + "ists"})
+    return frozenset(names)
+
+def route_prompt(prompt: str, role: str, facts: Dict[str, str]) -> Optional[FastPath]:
+    """
+    Matches prompts that are fully structured (a doctor's email, a date, a specialty) and
+    name one tool. Every word of the prompt has to be accounted for by the rule or be
+    filler, so anything the rules don't fully understand goes to the LLM agent instead.
+    Needs the doctor directory to be loaded.
+    """
+    text = prompt.lower()
+    emails = _EMAIL.findall(text)
+    text = _EMAIL.sub(" ", text)
+    dates = _ISO_DATE.findall(text)
+    text = _ISO_DATE.sub(" ", text)
+    words = set(_WORD.findall(text))
+    if "today" in words:
+        dates.append(date.today().isoformat())
+    if "tomorrow" in words:
+        dates.append((date.today() + timedelta(days=1)).isoformat())
+    words -= {"today", "tomorrow"}
+    if len(dates) > 1 or len(emails) > 1:
+        return None
+    day = dates[0] if dates else None
+    doctor = doctor_directory.get_by_email(emails[0]) if emails else None
+    if emails and not doctor:
+        return None
+    content = words - _FILLER
+
+    if doctor and content & _NEXT_SLOT_KEYS and content <= _NEXT_SLOT_WORDS:
+        return FastPath("find_next_available_slot", {"doctor_name_or_email": doctor.email, "from_date_str": day})
+    if doctor and content & _AVAILABILITY_KEYS and content <= _AVAILABILITY_WORDS:
+        return FastPath("check_doctor_availability", {"doctor_name_or_email": doctor.email, "target_date_str": day})
+
+    if role == "patient":
+        if emails or day or not content:
+            return None
+        phrase = " ".join(word for word in _WORD.findall(prompt.lower()) if word not in _FILLER)
+        for specialty in doctor_directory.specialties():
+            if phrase in _specialty_names(specialty):
+                return FastPath("get_doctors_by_specialty", {"specialty": specialty})
+        return None
+
+    if "patients" in content and content <= _COUNT_WORDS and ({"how", "many"} <= content or "count" in content or "number" in content):
+        return FastPath("get_patient_count_by_date", {
+            "target_date_str": day or date.today().isoformat(),
+            "doctor_email": doctor.email if doctor else None,
+        })
+    doctor_email = doctor.email if doctor else facts.get("doctor_email")
+    if doctor_email and content & _SUMMARY_KEYS and content <= _SUMMARY_WORDS:
+        return FastPath("get_appointments_summary_for_doctor", {"doctor_email": doctor_email, "target_date_str": day})
+    return None
+
+def render_tool_result(tool_name: str, output: Any) -> str:
+    """The reply for a fast-path turn, worded like the agent's own answers."""
+    if not isinstance(output, dict):
+        return str(output)
+    if output.get("status") != "success" or tool_name not in ("check_doctor_availability", "get_doctors_by_specialty"):
+        return output.get("message") or "I'm sorry, I couldn't process that."
+    if output.get("available_slots"):
+        slots = ", ".join(slot[:5] for slot in output["available_slots"])
+        return f"{output['doctor_name']} has these open slots on {output['date']}: {slots} (IST).\nWhich time would you like?"
+    if output.get("doctors"):
+        doctors = "\n".join(f"- {doctor['name']} ({doctor['email']})" for doctor in output["doctors"])
+        return f"Here are our {output['specialty']} doctors:\n{doctors}\nWhich doctor would you like to see?"
+    return output.get("message") or "I'm sorry, I couldn't process that."
+
+class TurnMetrics(BaseCallbackHandler):
+    """
+    Times one turn's chat model calls and counts them (each call is one agent iteration).
+    Inside a trace, each call also gets a span.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self.llm_calls = 0
+        self._started: Dict[Any, Tuple[float, Any]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = (time.perf_counter(), start_span("llm.call", "client", model=MODEL_NAME, messages=len(messages[0]) if messages else 0))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.llm_calls += 1
+        started, current = self._started.pop(run_id, (None, None))
+        if started is not None:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, model=MODEL_NAME, outcome="success")
+        for generations in response.generations:
+            usage = getattr(getattr(generations[0], "message", None), "usage_metadata", None) if generations else None
+            if usage:
+                LLM_TOKENS.inc(usage.get("input_tokens", 0), model=MODEL_NAME, kind="input")
+                LLM_TOKENS.inc(usage.get("output_tokens", 0), model=MODEL_NAME, kind="output")
+                if current:
+                    current.set(input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+        if current:
+            current.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.llm_calls += 1
+        started, current = self._started.pop(run_id, (None, None))
+        if started is not None:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, model=MODEL_NAME, outcome="error")
+        if current:
+            current.end(error)
+
+class DoctorAppointmentAgent:
+    """A chat session: the shared runtime for its role plus this conversation's memory."""
+    def __init__(self, role: str = "patient"):
+        self.role = role
+        self.runtime = get_agent_runtime(role)
+        self.memory = TokenBudgetMemory(role=_runtime_role(role))
+
+    @property
+    def agent_executor(self) -> AgentExecutor:
+        return self.runtime.agent_executor
+
+    async def _fast_path(self, prompt: str) -> Optional[Tuple[FastPath, Any, str]]:
+        """Answers the prompt with one direct tool call when route_prompt() matches it; None otherwise."""
+        if not AGENT_FAST_PATH:
+            return None
+        try:
+            async with get_async_db_context() as db:
+                await doctor_directory.ensure_loaded(db)
+            route = route_prompt(prompt, self.runtime.role, self.memory.facts)
+            if route is None:
+                return None
+            output = await self.runtime.tools_by_name[route.tool].ainvoke(route.args)
+        except Exception as e:
+            logger.warning(f"Fast path failed, falling back to the agent: {e}")
+            return None
+        response = render_tool_result(route.tool, output)
+        self.memory.record_tool_call(route.tool, route.args, output)
+        self.memory.save_context({"input": prompt}, {"output": response})
+        logger.info(f"Fast path answered with {route.tool} (role: {self.role}).")
+        return route, output, response
 
     async def run(self, prompt: str) -> Dict[str, Any]:
         """Runs the agent with the given prompt and returns the response."""
         logger.info(f"Agent running prompt (role: {self.role}): {prompt}")
-        try:
-            response = await self.agent_executor.ainvoke({"input": prompt})
-            return {"response": response.get("output", "I'm sorry, I couldn't process that.")}
-        except Exception as e:
-            logger.error(f"Error running agent: {e}", exc_info=True)
-            return {"response": f"I'm sorry, but an unexpected error occurred. Please try again later."}
+        with span("agent.run", "internal", role=self.role, prompt_chars=len(prompt)) as current:
+            started = time.perf_counter()
+            routed = await self._fast_path(prompt)
+            if routed:
+                CHAT_TURN_SECONDS.observe(time.perf_counter() - started, role=self.role, path="fast")
+                if current:
+                    current.set(path="fast", tool=routed[0].tool)
+                return {"response": routed[2]}
+            turn = TurnMetrics()
+            try:
+                with tool_call_limit():
+                    response = await self.agent_executor.ainvoke(
+                        {"input": prompt, **self.memory.load_memory_variables()}, config={"callbacks": [turn]}
+                    )
+                for action, observation in response.get("intermediate_steps", []):
+                    self.memory.record_tool_call(action.tool, action.tool_input, observation)
+                output = response.get("output", "I'm sorry, I couldn't process that.")
+                self.memory.save_context({"input": prompt}, {"output": output})
+                return {"response": output}
+            except Exception as e:
+                logger.error(f"Error running agent: {e}", exc_info=True)
+                return {"response": f"I'm sorry, but an unexpected error occurred. Please try again later."}
+            finally:
+                self._observe_turn(turn, started, current)
+
+    async def stream(self, prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Runs the agent like run(), yielding events as they happen: "token" for each chunk of
+        LLM output, "tool_start"/"tool_end" around tool calls and a last "final" event with
+        the complete response.
+        """
+        logger.info(f"Agent streaming prompt (role: {self.role}): {prompt}")
+        with span("agent.stream", "internal", role=self.role, prompt_chars=len(prompt)) as current:
+            started = time.perf_counter()
+            routed = await self._fast_path(prompt)
+            if routed:
+                CHAT_TURN_SECONDS.observe(time.perf_counter() - started, role=self.role, path="fast")
+                route, tool_output, response = routed
+                if current:
+                    current.set(path="fast", tool=route.tool)
+                yield {"type": "tool_start", "tool": route.tool, "input": route.args}
+                yield {"type": "tool_end", "tool": route.tool, "output": _preview(tool_output)}
+                output = response
+            else:
+                output = None
+                turn = TurnMetrics()
+                try:
+                    with tool_call_limit():
+                        async for event in self.agent_executor.astream_events(
+                            {"input": prompt, **self.memory.load_memory_variables()}, version="v2", config={"callbacks": [turn]}
+                        ):
+                            kind = event["event"]
+                            if kind == "on_chat_model_stream":
+                                text = _chunk_text(event["data"]["chunk"])
+                                if text:
+                                    yield {"type": "token", "text": text}
+                            elif kind == "on_tool_start":
+                                yield {"type": "tool_start", "tool": event["name"], "input": event["data"].get("input")}
+                            elif kind == "on_tool_end":
+                                self.memory.record_tool_call(event["name"], event["data"].get("input"), event["data"].get("output"))
+                                yield {"type": "tool_end", "tool": event["name"], "output": _preview(event["data"].get("output"))}
+                            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                                output = (event["data"].get("output") or {}).get("output")
+                    output = output or "I'm sorry, I couldn't process that."
+                    self.memory.save_context({"input": prompt}, {"output": output})
+                except Exception as e:
+                    logger.error(f"Error streaming agent: {e}", exc_info=True)
+                    output = "I'm sorry, but an unexpected error occurred. Please try again later."
+                self._observe_turn(turn, started, current)
+        yield {"type": "final", "response": output}
+
+    def _observe_turn(self, turn: TurnMetrics, started: float, current: Optional[Span] = None):
+        CHAT_TURN_SECONDS.observe(time.perf_counter() - started, role=self.role, path="agent")
+        if turn.llm_calls:
+            AGENT_ITERATIONS.observe(turn.llm_calls, role=self.role)
+        if current:
+            current.set(path="agent", llm_calls=turn.llm_calls)
+
+    def approximate_memory_bytes(self) -> int:
+        """Rough size of the conversation this agent keeps in memory."""
+        return self.memory.approximate_bytes()
 
     async def close(self):
-        """A method to clean up resources if needed in the future."""
-        await self.mcp_client.close()
\ No newline at end of file
+        """Drops this session's conversation; the shared runtime lives for the whole process."""
+        self.memory.clear()
@@ -0,0 +1,151 @@
+# backend/agents/memory.py
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+CHAT_MEMORY_MAX_TOKENS = int(os.getenv("CHAT_MEMORY_MAX_TOKENS", "1500"))
+CHAT_MEMORY_SUMMARY_TOKENS = int(os.getenv("CHAT_MEMORY_SUMMARY_TOKENS", "300"))
+# How much of each side of a turn survives in its summary line.
+SUMMARY_CLIP_CHARS = 160
+MAX_DOCTOR_CANDIDATES = 5
+
+PINNED_FACTS = ("patient_email", "doctor_email", "doctor_name", "doctor_candidates", "reason", "appointment_id")
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+REASON_QUESTION = re.compile(r"\b(reason|symptom)", re.IGNORECASE)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token); close enough for budgeting."""
+    return len(text) // 4 + 1
+
+def _clip(text: str, limit: int = SUMMARY_CLIP_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+@dataclass
+class _Turn:
+    user: str
+    assistant: str
+    tokens: int
+
+class TokenBudgetMemory:
+    """
+    Conversation memory that keeps the prompt under `max_tokens`.
+
+    The latest turns are kept verbatim as chat history. When they no longer fit, the
+    oldest turn is compacted into a one-line entry of a running summary, which is itself
+    capped at `summary_tokens` (oldest lines go first). Facts the booking flow depends on
+    (emails, reason, appointment id) are pinned separately, from the user's messages and
+    from tool calls, so compaction never loses them. Summary and facts reach the prompt
+    through the `memory_context` variable.
+    """
+    def __init__(self, role: str = "patient", max_tokens: int = CHAT_MEMORY_MAX_TOKENS, summary_tokens: int = CHAT_MEMORY_SUMMARY_TOKENS):
+        self.role = role
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.facts: Dict[str, str] = {}
+        self.compacted_turns = 0
+        self._turns: List[_Turn] = []
+        self._history_tokens = 0
+        self._summary: List[str] = []
+        self._summary_token_count = 0
+
+    def load_memory_variables(self, inputs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        history: List[BaseMessage] = []
+        for turn in self._turns:
+            history.extend((HumanMessage(content=turn.user), AIMessage(content=turn.assistant)))
+        return {"chat_history": history, "memory_context": self.context()}
+
+    def context(self) -> str:
+        parts = []
+        facts = [f"{name}={self.facts[name]}" for name in PINNED_FACTS if name in self.facts]
+        if facts:
+            parts.append("Known facts (use these exact values): " + "; ".join(facts))
+        if self._summary:
+            parts.append("Earlier in this conversation:\n" + "\n".join(self._summary))
+        return "CONVERSATION MEMORY:\n" + "\n".join(parts) if parts else ""
+
+    def prompt_tokens(self) -> int:
+        """Estimated tokens this memory adds to each prompt."""
+        return self._history_tokens + estimate_tokens(self.context())
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, Any]):
+        user, assistant = inputs["input"], outputs["output"]
+        self._pin_from_user(user)
+        turn = _Turn(user, assistant, estimate_tokens(user) + estimate_tokens(assistant))
+        self._turns.append(turn)
+        self._history_tokens += turn.tokens
+        # The latest turn is always kept whole, even if it alone is over budget.
+        while len(self._turns) > 1 and self.prompt_tokens() > self.max_tokens:
+            self._compact_oldest()
+
+    def record_tool_call(self, tool_name: str, tool_input: Any, output: Any):
+        """Pins the facts a tool call reveals: the arguments it was given and the doctor or appointment it returned."""
+        if isinstance(tool_input, dict):
+            for name in ("patient_email", "doctor_email", "reason"):
+                if tool_input.get(name):
+                    self.facts[name] = str(tool_input[name])
+        if not isinstance(output, dict) or output.get("status") != "success":
+            return
+        if output.get("doctor_email"):
+            self._pin_doctor(output.get("doctor_name"), output["doctor_email"])
+        details = output.get("doctor_details")
+        if isinstance(details, dict) and details.get("email"):
+            self._pin_doctor(details.get("name"), details["email"])
+        doctors = output.get("doctors")
+        if isinstance(doctors, list) and doctors:
+            if len(doctors) == 1:
+                self._pin_doctor(doctors[0].get("name"), doctors[0].get("email"))
+            else:
+                self.facts["doctor_candidates"] = ", ".join(
+                    f"{doctor.get('name')} <{doctor.get('email')}>" for doctor in doctors[:MAX_DOCTOR_CANDIDATES]
+                )
+        if tool_name == "book_appointment" and output.get("appointment_id"):
+            self.facts["appointment_id"] = str(output["appointment_id"])
+
+    def _pin_doctor(self, name: Optional[str], email: Optional[str]):
+        if not email:
+            return
+        self.facts["doctor_email"] = email
+        if name:
+            self.facts["doctor_name"] = name
+        self.facts.pop("doctor_candidates", None)
+
+    def _pin_from_user(self, user: str):
+        emails = EMAIL_PATTERN.findall(user)
+        if emails:
+            # Patients give their own email; doctors asking for reports give theirs.
+            key = "patient_email" if self.role == "patient" else "doctor_email"
+            known = {self.facts.get("doctor_email"), self.facts.get("patient_email")} - {self.facts.get(key)}
+            new = [email for email in emails if email not in known]
+            if new:
+                self.facts[key] = new[-1]
+        elif self.role == "patient" and self._turns and REASON_QUESTION.search(self._turns[-1].assistant):
+            self.facts["reason"] = _clip(user, 200)
+
+    def _compact_oldest(self):
+        turn = self._turns.pop(0)
+        self._history_tokens -= turn.tokens
+        line = f"- User: {_clip(turn.user)} | Assistant: {_clip(turn.assistant)}"
+        self._summary.append(line)
+        self._summary_token_count += estimate_tokens(line)
+        while len(self._summary) > 1 and self._summary_token_count > self.summary_tokens:
+            self._summary_token_count -= estimate_tokens(self._summary.pop(0))
+        self.compacted_turns += 1
+
+    def approximate_bytes(self) -> int:
+        return (
+            sum(sys.getsizeof(turn.user) + sys.getsizeof(turn.assistant) for turn in self._turns)
+            + sum(sys.getsizeof(line) for line in self._summary)
+            + sum(sys.getsizeof(value) for value in self.facts.values())
+        )
+
+    def clear(self):
+        self.facts.clear()
+        self._turns.clear()
+        self._summary.clear()
+        self._history_tokens = 0
+        self._summary_token_count = 0
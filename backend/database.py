@@ -1,11 +1,17 @@
 # backend/database.py - ENHANCED VERSION
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator
 from dotenv import load_dotenv
 import logging
 
+from backend.services.metrics import instrument_engine
+from backend.services.tracing import trace_engine
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -19,6 +25,35 @@ engine = create_engine(
     echo=False  
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _async_database_url(url: str) -> URL:
+    """Maps the sync DATABASE_URL onto its async driver (asyncpg / aiosqlite)."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        query = dict(url.query)
+        # asyncpg takes `ssl`, not libpq's `sslmode`.
+        sslmode = query.pop("sslmode", None)
+        if sslmode:
+            query["ssl"] = sslmode
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+
+_async_engine_options = {"pool_pre_ping": True, "pool_recycle": 300, "echo": False}
+if make_url(ASYNC_DATABASE_URL).get_backend_name() != "sqlite":
+    _async_engine_options["pool_size"] = int(os.getenv("DB_POOL_SIZE", "10"))
+    _async_engine_options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_engine_options)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+trace_engine(engine)
+trace_engine(async_engine.sync_engine)
 Base = declarative_base()
 
 logging.basicConfig(level=logging.INFO)
@@ -44,8 +79,25 @@ def get_db_context():
     finally:
         db.close()
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+@asynccontextmanager
+async def get_async_db_context() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            await db.rollback()
+            raise
+
 def init_db():
     logger.info("Initializing database...")
     from . import models
-    Base.metadata.create_all(bind=engine)
+    from .migrations import upgrade
+    # create_all never alters existing tables; indexes and data changes ship as migrations.
+    upgrade(engine, metadata=Base.metadata)
     logger.info("Database tables created or already exist.")
\ No newline at end of file
@@ -1,25 +1,67 @@
 import os
+import sys
+import json
+import time
 import logging
-import uuid
-from fastapi import FastAPI, Request, HTTPException, Depends, Body
-from fastapi.responses import HTMLResponse
+import importlib
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Request, HTTPException, Depends, Body, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from typing import Dict, Any, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any, List, Optional
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from pydantic import BaseModel
 
-from backend.database import init_db, get_db
-from backend.services.seeder import seed_all
-from backend.agents.doctor_agent import DoctorAppointmentAgent
+from backend.database import init_db, get_db, get_async_db
+from backend.mcp_client import MCPClient, TOOL_BATCH_MAX_CALLS, TOOL_CALL_CONCURRENCY
+from backend.services.session_store import ChatSessionStore
+from backend.services.outbox import outbox_workers
+from backend.services.email_service import close_smtp_pool
+from backend.services.slack_notifier import slack_notifier
+from backend.services.tool_cache import tool_cache
+from backend.services.metrics import registry
+from backend.services.tracing import exporter as span_exporter, start_trace
 from backend.mcp_tools import appointment_tools, availability_tools, reporting_tools, doctor_tools
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-CHAT_SESSIONS: Dict[str, DoctorAppointmentAgent] = {}
+# Modules that are imported on first use rather than at startup; /startup/stats reports
+# whether each has been loaded. The agent stack is by far the largest.
+LAZY_MODULES = {
+    "agent": "backend.agents.doctor_agent",  # LangChain and langchain_google_genai
+    "seeder": "backend.services.seeder",  # Faker
+    "google_calendar_client": "googleapiclient.discovery",
+}
+STARTUP_REPORT: Dict[str, Any] = {"lazy_load_seconds": {}}
+
+async def _load_lazy(name: str):
+    """Imports a LAZY_MODULES module in a worker thread, so the first request to need it doesn't block the event loop."""
+    module_name = LAZY_MODULES[name]
+    module = sys.modules.get(module_name)
+    if module is None:
+        started = time.perf_counter()
+        module = await run_in_threadpool(importlib.import_module, module_name)
+        STARTUP_REPORT["lazy_load_seconds"].setdefault(name, round(time.perf_counter() - started, 3))
+        logger.info(f"Loaded {module_name} on first use in {time.perf_counter() - started:.2f}s.")
+    return module
+
+CHAT_SESSIONS = ChatSessionStore(
+    max_sessions=int(os.getenv("CHAT_SESSION_MAX", "1000")),
+    idle_ttl_seconds=float(os.getenv("CHAT_SESSION_IDLE_TTL_SECONDS", "1800")),
+    max_memory_bytes=int(float(os.getenv("CHAT_SESSION_MAX_MEMORY_MB", "256")) * 1024 * 1024),
+    size_of=lambda agent: agent.approximate_memory_bytes(),
+)
+
+registry.gauge("healthnexus_chat_sessions", "Chat sessions held in memory.", lambda: CHAT_SESSIONS.stats()["sessions"])
+registry.gauge("healthnexus_tool_cache_hit_ratio", "Share of cacheable tool lookups served from the cache.", lambda: tool_cache.stats()["hit_rate"])
 
 app = FastAPI(
     title="Doctor Appointment Assistant",
@@ -41,7 +83,18 @@ templates = Jinja2Templates(directory="backend/templates")
 @app.on_event("startup")
 async def startup_event():
     logger.info("Application startup: Initializing database.")
-    init_db()
+    started = time.perf_counter()
+    # create_all and the migrations are blocking DDL; run them off the event loop.
+    await run_in_threadpool(init_db)
+    STARTUP_REPORT["init_db_seconds"] = round(time.perf_counter() - started, 3)
+    outbox_workers.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await outbox_workers.stop()
+    close_smtp_pool()
+    await slack_notifier.aclose()
+    await run_in_threadpool(span_exporter.flush)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
@@ -50,7 +103,8 @@ async def read_root(request: Request):
 @app.get("/seed")
 async def seed_database(db: Session = Depends(get_db)):
     try:
-        seed_all(db)
+        seeder = await _load_lazy("seeder")
+        await run_in_threadpool(seeder.seed_all, db)
         return {"message": "Database seeded successfully!"}
     except Exception as e:
         logger.error(f"Error seeding database: {e}", exc_info=True)
@@ -60,49 +114,146 @@ class ChatRequest(BaseModel):
     prompt: str
     role: str = "patient"
     session_id: Optional[str] = None
+    # Adds a summary of this request's trace (where the time went) to the response.
+    debug: bool = False
 
 @app.post("/chat/")
 async def chat_with_agent(chat_request: ChatRequest) -> Dict[str, Any]:
-    session_id = chat_request.session_id
-    if not session_id or session_id not in CHAT_SESSIONS:
-        session_id = str(uuid.uuid4())
-        logger.info(f"Creating new agent for session_id: {session_id}")
-        CHAT_SESSIONS[session_id] = DoctorAppointmentAgent(role=chat_request.role)
-    
-    agent = CHAT_SESSIONS[session_id]
-    if agent.role != chat_request.role:
-        logger.info(f"Role changed for session {session_id}. Creating new agent.")
-        agent = DoctorAppointmentAgent(role=chat_request.role)
-        CHAT_SESSIONS[session_id] = agent
-        
-    logger.info(f"Using agent for session_id: {session_id} with role: {agent.role}")
-    try:
-        response = await agent.run(chat_request.prompt)
-        response['session_id'] = session_id
+    role = chat_request.role
+    agent_module = await _load_lazy("agent")
+    with start_trace("POST /chat/", record=chat_request.debug, role=role) as root:
+        async with CHAT_SESSIONS.checkout(
+            chat_request.session_id,
+            factory=lambda: agent_module.DoctorAppointmentAgent(role=role),
+            is_valid=lambda agent: agent.role == role,
+        ) as (session_id, agent):
+            logger.info(f"Using agent for session_id: {session_id} with role: {agent.role}")
+            if root:
+                root.trace.set(session_id=session_id)
+            try:
+                response = await agent.run(chat_request.prompt)
+                response['session_id'] = session_id
+            except Exception as e:
+                logger.error(f"Error processing chat request: {e}", exc_info=True)
+                response = {"response": f"An error occurred: {e}", "session_id": session_id}
+        if root and chat_request.debug:
+            response["trace"] = root.trace.summary()
         return response
-    except Exception as e:
-        logger.error(f"Error processing chat request: {e}", exc_info=True)
-        return {"response": f"An error occurred: {e}", "session_id": session_id}
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.post("/chat/stream")
+async def stream_chat_with_agent(chat_request: ChatRequest) -> StreamingResponse:
+    """Same as /chat/, but as Server-Sent Events: session, token, tool_start, tool_end and a last final event."""
+    role = chat_request.role
+
+    async def events():
+        agent_module = await _load_lazy("agent")
+        with start_trace("POST /chat/stream", record=chat_request.debug, role=role) as root:
+            async with CHAT_SESSIONS.checkout(
+                chat_request.session_id,
+                factory=lambda: agent_module.DoctorAppointmentAgent(role=role),
+                is_valid=lambda agent: agent.role == role,
+            ) as (session_id, agent):
+                logger.info(f"Streaming agent for session_id: {session_id} with role: {agent.role}")
+                if root:
+                    root.trace.set(session_id=session_id)
+                yield _sse({"type": "session", "session_id": session_id})
+                async for event in agent.stream(chat_request.prompt):
+                    if event["type"] == "final" and root and chat_request.debug:
+                        event["trace"] = root.trace.summary()
+                    yield _sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/sessions/stats")
+async def chat_session_stats() -> Dict[str, Any]:
+    return CHAT_SESSIONS.stats()
+
+@app.get("/cache/stats")
+async def tool_cache_stats() -> Dict[str, Any]:
+    return tool_cache.stats()
+
+@app.get("/startup/stats")
+async def startup_stats() -> Dict[str, Any]:
+    return {
+        **STARTUP_REPORT,
+        "loaded": {name: module_name in sys.modules for name, module_name in LAZY_MODULES.items()},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # --- Tool Endpoints ---
 
+class ToolInvocation(BaseModel):
+    tool: str
+    arguments: Dict[str, Any] = {}
+
+class ToolBatchRequest(BaseModel):
+    calls: List[ToolInvocation]
+    concurrency: Optional[int] = None
+
+@app.post("/tools/batch")
+async def call_tools_batch(batch: ToolBatchRequest) -> Dict[str, Any]:
+    """
+    Runs several tool calls in one request, with the same argument schemas as the agent's tools.
+    A failing call doesn't fail the batch; every call gets its own status, result or error and timing.
+    """
+    if not batch.calls:
+        raise HTTPException(status_code=400, detail="No tool calls given.")
+    if len(batch.calls) > TOOL_BATCH_MAX_CALLS:
+        raise HTTPException(status_code=400, detail=f"At most {TOOL_BATCH_MAX_CALLS} tool calls per batch.")
+    concurrency = max(1, min(batch.concurrency or TOOL_CALL_CONCURRENCY, TOOL_CALL_CONCURRENCY))
+    start = time.perf_counter()
+    results = await MCPClient().run_batch([(call.tool, call.arguments) for call in batch.calls], concurrency)
+    return {
+        "results": results,
+        "succeeded": sum(1 for result in results if result["status"] == "success"),
+        "failed": sum(1 for result in results if result["status"] != "success"),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
 @app.post("/tools/book_appointment/")
-async def call_book_appointment(patient_email: str = Body(...), doctor_email: str = Body(...), appointment_time_str: str = Body(...), reason: str = Body(None), db: Session = Depends(get_db)):
+async def call_book_appointment(patient_email: str = Body(...), doctor_email: str = Body(...), appointment_time_str: str = Body(...), reason: str = Body(None), db: AsyncSession = Depends(get_async_db)):
     """
-    This endpoint runs the full booking process and returns the simplest
-    possible success message to guarantee it never crashes.
+    This endpoint runs the full booking process. A booking the tool turns down
+    (slot taken, unknown doctor) is a 400 with the tool's message.
     """
     try:
-        await appointment_tools.book_appointment(db, patient_email, doctor_email, appointment_time_str, reason)
-
-        return {"status": "success", "message": "Appointment has been confirmed."}
-
+        result = await appointment_tools.book_appointment(db, patient_email, doctor_email, appointment_time_str, reason)
     except Exception as e:
         logger.error(f"A critical error occurred in the booking tool endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
+    return {"status": "success", "message": "Appointment has been confirmed.", "appointment_id": result.get("appointment_id")}
     
+@app.post("/tools/send_appointment_reminders/")
+async def call_send_appointment_reminders(target_date_str: str = Body(None, embed=True), db: AsyncSession = Depends(get_async_db)):
+    result = await appointment_tools.send_appointment_reminders(db, target_date_str)
+    if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
+    return result
+
+@app.post("/tools/cancel_appointment/")
+async def call_cancel_appointment(appointment_id: int = Body(...), patient_email: str = Body(...), db: AsyncSession = Depends(get_async_db)):
+    result = await appointment_tools.cancel_appointment(db, appointment_id, patient_email)
+    if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
+    return result
+
+@app.get("/tools/get_booking_status/")
+async def call_get_booking_status(appointment_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await appointment_tools.get_booking_status(db, appointment_id)
+    if "error" in result.get("status", ""): raise HTTPException(status_code=404, detail=result.get("message"))
+    return result
+
 @app.get("/tools/check_doctor_availability/")
-async def call_check_doctor_availability(doctor_name_or_email: str, target_date_str: str = None, db: Session = Depends(get_db)):
+async def call_check_doctor_availability(doctor_name_or_email: str, target_date_str: str = None, db: AsyncSession = Depends(get_async_db)):
     try:
         result = await availability_tools.check_doctor_availability(db, doctor_name_or_email, target_date_str)
         if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
@@ -110,20 +261,43 @@ async def call_check_doctor_availability(doctor_name_or_email: str, target_date_
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/tools/find_next_available_slot/")
+async def call_find_next_available_slot(doctor_name_or_email: str, days: int = 7, from_date_str: str = None, db: AsyncSession = Depends(get_async_db)):
+    result = await availability_tools.find_next_available_slot(db, doctor_name_or_email, days, from_date_str)
+    if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
+    return result
+
 @app.get("/tools/get_appointments_summary_for_doctor/")
-async def call_get_appointments_summary_for_doctor(doctor_email: str, target_date_str: str = None, db: Session = Depends(get_db)):
+async def call_get_appointments_summary_for_doctor(doctor_email: str, target_date_str: str = None, db: AsyncSession = Depends(get_async_db)):
     result = await reporting_tools.get_appointments_summary_for_doctor(db, doctor_email, target_date_str)
     if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
     return result
 
+@app.get("/tools/get_appointments_report/")
+async def call_get_appointments_report(start_date_str: str, end_date_str: str = None, doctor_emails: List[str] = Query(None), specialty: str = None, send_to_slack: bool = False, db: AsyncSession = Depends(get_async_db)):
+    result = await reporting_tools.get_appointments_report(db, start_date_str, end_date_str, doctor_emails, specialty, send_to_slack)
+    if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
+    return result
+
+@app.get("/tools/get_patient_count_by_date/")
+async def call_get_patient_count_by_date(target_date_str: str, doctor_email: str = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        result = await reporting_tools.get_patient_count_by_date(db, target_date_str, doctor_email)
+    except reporting_tools.ToolException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
+    return result
+
 @app.get("/tools/get_doctors_by_specialty/")
-async def call_get_doctors_by_specialty(specialty: str, db: Session = Depends(get_db)):
+async def call_get_doctors_by_specialty(specialty: str, db: AsyncSession = Depends(get_async_db)):
     result = await doctor_tools.get_doctors_by_specialty(db=db, specialty=specialty)
     if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
     return result
 
 @app.get("/tools/get_doctor_details_by_name/")
-async def call_get_doctor_details_by_name(doctor_name: str, db: Session = Depends(get_db)):
+async def call_get_doctor_details_by_name(doctor_name: str, db: AsyncSession = Depends(get_async_db)):
     result = await doctor_tools.get_doctor_details_by_name(db=db, doctor_name=doctor_name)
     if "error" in result.get("status", ""): raise HTTPException(status_code=400, detail=result.get("message"))
     return result
+
+STARTUP_REPORT["import_seconds"] = round(time.perf_counter() - _import_started, 3)
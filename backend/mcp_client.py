@@ -1,30 +1,85 @@
 # backend/mcp_client.py
 
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Any, Awaitable, Callable, Iterator, List, Optional, Tuple, Type
 import asyncio
-from langchain.tools import StructuredTool
-from typing import Dict, Any, List, Optional
+import hashlib
 import logging
-from pydantic import BaseModel, Field
-from backend.database import get_db_context  # <-- Import the new context manager
+import os
+import time
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db_context
 from backend.mcp_tools import appointment_tools, availability_tools, doctor_tools, reporting_tools
+from backend.services.metrics import TOOL_CALL_SECONDS, result_status
+from backend.services.tool_cache import tool_cache
+from backend.services.tracing import span
+
+if TYPE_CHECKING:
+    from langchain_core.tools import StructuredTool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+TOOL_BATCH_MAX_CALLS = int(os.getenv("TOOL_BATCH_MAX_CALLS", "50"))
+
+# Set for the duration of an agent turn. AgentExecutor runs the tool calls of one step
+# with asyncio.gather, and the tasks it creates inherit this, so they share one limit.
+_tool_call_limiter: ContextVar[Optional[asyncio.Semaphore]] = ContextVar("tool_call_limiter", default=None)
+
+@contextmanager
+def tool_call_limit(limit: int = TOOL_CALL_CONCURRENCY) -> Iterator[None]:
+    """Caps how many tool calls made inside this block run at once, each with its own DB session."""
+    token = _tool_call_limiter.set(asyncio.Semaphore(max(1, limit)))
+    try:
+        yield
+    finally:
+        try:
+            _tool_call_limiter.reset(token)
+        except ValueError:
+            # An async generator closed from another context (e.g. a dropped stream).
+            pass
+
 class BookAppointmentInput(BaseModel):
     patient_email: str = Field(description="The email address of the patient.")
     doctor_email: str = Field(description="The email address of the doctor.")
     appointment_time_str: str = Field(description="The desired appointment time in 'YYYY-MM-DD HH:MM:SS' format.")
     reason: Optional[str] = Field(None, description="The reason for the appointment.")
 
+class GetBookingStatusInput(BaseModel):
+    appointment_id: int = Field(description="The ID of the appointment returned by book_appointment.")
+
+class CancelAppointmentInput(BaseModel):
+    appointment_id: int = Field(description="The ID of the appointment to cancel.")
+    patient_email: str = Field(description="The patient's email address; the appointment must belong to this patient.")
+
 class CheckAvailabilityInput(BaseModel):
     doctor_name_or_email: str = Field(description="The name or email of the doctor to check.")
     target_date_str: Optional[str] = Field(None, description="The target date in 'YYYY-MM-DD' format. Defaults to today.")
 
+class FindNextSlotInput(BaseModel):
+    doctor_name_or_email: str = Field(description="The name or email of the doctor.")
+    days: int = Field(7, description="How many days ahead to search.")
+    from_date_str: Optional[str] = Field(None, description="The first day to search in 'YYYY-MM-DD' format. Defaults to today.")
+
 class GetSummaryInput(BaseModel):
     doctor_email: str = Field(description="The email address of the doctor for whom to get the summary.")
     target_date_str: Optional[str] = Field(None, description="The target date in 'YYYY-MM-DD' format. Defaults to today.")
 
+class GetAppointmentsReportInput(BaseModel):
+    start_date_str: str = Field(description="The first day of the report in 'YYYY-MM-DD' format.")
+    end_date_str: Optional[str] = Field(None, description="The last day of the report in 'YYYY-MM-DD' format. Defaults to start_date_str.")
+    doctor_emails: Optional[List[str]] = Field(None, description="The email addresses of the doctors to include.")
+    specialty: Optional[str] = Field(None, description="Include every doctor of this specialty, e.g., 'Neurology'.")
+    send_to_slack: bool = Field(False, description="Also post the report to Slack.")
+
+class GetPatientCountInput(BaseModel):
+    target_date_str: str = Field(description="The date in 'YYYY-MM-DD' format.")
+    doctor_email: Optional[str] = Field(None, description="Only count this doctor's patients.")
+
 class GetDoctorsInput(BaseModel):
     specialty: str = Field(description="The medical specialty to search for, e.g., 'General Practice', 'Neurology'.")
 
@@ -32,54 +87,139 @@ class GetDoctorDetailsInput(BaseModel):
     doctor_name: str = Field(description="The full name of the doctor to look up details for.")
 
 
+@dataclass(frozen=True)
+class ToolSpec:
+    name: str
+    description: str
+    func: Callable[..., Awaitable[Any]]
+    args_schema: Type[BaseModel]
+    # Arguments recorded as-is on the tool's trace span (ids, dates, flags). Email arguments
+    # are recorded as a hash; anything else, such as a patient's reason, is left out.
+    span_arguments: Tuple[str, ...] = ()
+
+# Every tool the agent can use; the /tools/batch endpoint validates calls against the same schemas.
+TOOL_SPECS: Dict[str, ToolSpec] = {spec.name: spec for spec in (
+    ToolSpec("book_appointment", "Use this to book a new appointment.",
+             appointment_tools.book_appointment, BookAppointmentInput, ("appointment_time_str",)),
+    ToolSpec("get_booking_status", "Check whether a booked appointment's confirmation email and calendar invite have been delivered.",
+             appointment_tools.get_booking_status, GetBookingStatusInput, ("appointment_id",)),
+    ToolSpec("cancel_appointment", "Cancel a booked appointment by its ID and free the time slot.",
+             appointment_tools.cancel_appointment, CancelAppointmentInput, ("appointment_id",)),
+    ToolSpec("check_doctor_availability", "Check when a doctor is available.",
+             availability_tools.check_doctor_availability, CheckAvailabilityInput, ("target_date_str",)),
+    ToolSpec("find_next_available_slot", "Find the earliest open appointment slot with a doctor in the coming days.",
+             availability_tools.find_next_available_slot, FindNextSlotInput, ("days", "from_date_str")),
+    ToolSpec("get_appointments_summary_for_doctor", "Get a summary of a doctor's appointments.",
+             reporting_tools.get_appointments_summary_for_doctor, GetSummaryInput, ("target_date_str",)),
+    ToolSpec("get_appointments_report", "Get appointments over a date range for several doctors or a whole specialty, grouped per doctor and day.",
+             reporting_tools.get_appointments_report, GetAppointmentsReportInput,
+             ("start_date_str", "end_date_str", "specialty", "send_to_slack")),
+    ToolSpec("get_patient_count_by_date", "Count the unique patients and appointments on a date, for the clinic or one doctor.",
+             reporting_tools.get_patient_count_by_date, GetPatientCountInput, ("target_date_str",)),
+    ToolSpec("get_doctors_by_specialty", "Find doctors by their specialty.",
+             doctor_tools.get_doctors_by_specialty, GetDoctorsInput, ("specialty",)),
+    ToolSpec("get_doctor_details_by_name", "Get details for a specific doctor.",
+             doctor_tools.get_doctor_details_by_name, GetDoctorDetailsInput, ("doctor_name",)),
+)}
+
+def _hash_email(value: Any) -> Any:
+    if isinstance(value, str):
+        return hashlib.sha256(value.strip().lower().encode()).hexdigest()[:16]
+    if isinstance(value, list):
+        return [_hash_email(item) for item in value]
+    return value
+
+def _span_arguments(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """The arguments safe to put on a span: the tool's allowlisted ones, plus hashes of email arguments."""
+    spec = TOOL_SPECS.get(tool_name)
+    allowed = spec.span_arguments if spec else ()
+    recorded: Dict[str, Any] = {}
+    for name, value in arguments.items():
+        if name in allowed:
+            recorded[name] = value
+        elif "email" in name:
+            recorded[f"{name}_hash"] = _hash_email(value)
+    return recorded
+
+async def _timed_tool_call(tool_name: str, arguments: Dict[str, Any], call: Awaitable[Any]) -> Any:
+    with span(f"tool.{tool_name}", **_span_arguments(tool_name, arguments)) as current, TOOL_CALL_SECONDS.time(tool=tool_name) as labels:
+        result = await call
+        labels["status"] = result_status(result)
+        if current:
+            current.set(status=labels["status"])
+    return result
+
 class MCPClient:
     def _create_async_tool_func(self, tool_async_func):
-        async def wrapper(**kwargs):
-            with get_db_context() as db:
-                return await tool_async_func(db=db, **kwargs)
-        return wrapper
+        tool_name = tool_async_func.__name__
+
+        async def call(**kwargs):
+            limiter = _tool_call_limiter.get()
+            if limiter is None:
+                async with get_async_db_context() as db:
+                    return await _timed_tool_call(tool_name, kwargs, tool_async_func(db=db, **kwargs))
+            async with limiter:
+                async with get_async_db_context() as db:
+                    return await _timed_tool_call(tool_name, kwargs, tool_async_func(db=db, **kwargs))
+
+        if not tool_cache.is_cached(tool_name):
+            return call
 
-    def _create_sync_tool_func(self, tool_async_func):
-        async_func = self._create_async_tool_func(tool_async_func)
-        def wrapper(**kwargs):
-            return asyncio.run(async_func(**kwargs))
+        async def wrapper(**kwargs):
+            # A cache hit doesn't open a database session at all.
+            return await tool_cache.get_or_call(tool_name, kwargs, lambda: call(**kwargs))
         return wrapper
 
-    def get_langchain_tools(self) -> List[StructuredTool]:
+    def get_langchain_tools(self) -> List["StructuredTool"]:
+        # LangChain is only needed by the agent; the /tools endpoints use the specs directly.
+        from langchain.tools import StructuredTool
         return [
             StructuredTool.from_function(
-                name="book_appointment",
-                description="Use this to book a new appointment.",
-                func=self._create_sync_tool_func(appointment_tools.book_appointment),
-                coro=self._create_async_tool_func(appointment_tools.book_appointment),
-                args_schema=BookAppointmentInput
-            ),
-            StructuredTool.from_function(
-                name="check_doctor_availability",
-                description="Check when a doctor is available.",
-                func=self._create_sync_tool_func(availability_tools.check_doctor_availability),
-                coro=self._create_async_tool_func(availability_tools.check_doctor_availability),
-                args_schema=CheckAvailabilityInput
-            ),
-            StructuredTool.from_function(
-                name="get_appointments_summary_for_doctor",
-                description="Get a summary of a doctor's appointments.",
-                func=self._create_sync_tool_func(reporting_tools.get_appointments_summary_for_doctor),
-                coro=self._create_async_tool_func(reporting_tools.get_appointments_summary_for_doctor),
-                args_schema=GetSummaryInput
-            ),
-            StructuredTool.from_function(
-                name="get_doctors_by_specialty",
-                description="Find doctors by their specialty.",
-                func=self._create_sync_tool_func(doctor_tools.get_doctors_by_specialty),
-                coro=self._create_async_tool_func(doctor_tools.get_doctors_by_specialty),
-                args_schema=GetDoctorsInput
-            ),
-            StructuredTool.from_function(
-                name="get_doctor_details_by_name",
-                description="Get details for a specific doctor.",
-                func=self._create_sync_tool_func(doctor_tools.get_doctor_details_by_name),
-                coro=self._create_async_tool_func(doctor_tools.get_doctor_details_by_name),
-                args_schema=GetDoctorDetailsInput
-            ),
-        ]
\ No newline at end of file
+                name=spec.name,
+                description=spec.description,
+                coroutine=self._create_async_tool_func(spec.func),
+                args_schema=spec.args_schema
+            )
+            for spec in TOOL_SPECS.values()
+        ]
+
+    async def _run_batch_call(self, db: AsyncSession, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        entry: Dict[str, Any] = {"tool": tool_name}
+        spec = TOOL_SPECS.get(tool_name)
+        if spec is None:
+            entry.update(status="error", error=f"Unknown tool '{tool_name}'.", elapsed_ms=0.0)
+            return entry
+        try:
+            # Only the arguments given, as StructuredTool passes them, so agent and batch calls share cache entries.
+            kwargs = spec.args_schema(**arguments).model_dump(exclude_unset=True)
+            result = await tool_cache.get_or_call(tool_name, kwargs, lambda: _timed_tool_call(tool_name, kwargs, spec.func(db=db, **kwargs)))
+            entry["status"] = result.get("status", "success") if isinstance(result, dict) else "success"
+            entry["result"] = result
+        except ValidationError as e:
+            entry["status"] = "error"
+            entry["error"] = e.errors(include_url=False)
+        except Exception as e:
+            logger.error(f"Batch call to {tool_name} failed: {e}", exc_info=True)
+            await db.rollback()
+            entry["status"] = "error"
+            entry["error"] = str(e)
+        entry["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return entry
+
+    async def run_batch(self, calls: List[Tuple[str, Dict[str, Any]]], concurrency: int = TOOL_CALL_CONCURRENCY) -> List[Dict[str, Any]]:
+        """
+        Runs (tool name, arguments) calls with at most `concurrency` in flight and returns one
+        entry per call, in order: tool, status, result or error, and elapsed_ms. Each worker
+        keeps one DB session for all the calls it picks up, instead of one session per call.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+        pending = iter(enumerate(calls))
+
+        async def worker():
+            async with get_async_db_context() as db:
+                for index, (tool_name, arguments) in pending:
+                    results[index] = await self._run_batch_call(db, tool_name, arguments)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(calls))))))
+        return results
@@ -1,12 +1,18 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 import pytz
 import logging
 
-from backend.models import Appointment, Doctor, Patient, DoctorAvailability
-from backend.services.google_calendar import create_event
-from backend.services.email_service import send_email
+from backend.models import Appointment, Doctor, Patient, DoctorAvailability, OutboxEvent
+from backend.services import outbox
+from backend.services.daily_stats import record_appointment_change
+from backend.services.email_service import send_emails
+from backend.services.slot_index import slot_index
+from backend.services.tool_cache import AVAILABILITY_TOOLS, tool_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,8 +22,22 @@ IST = pytz.timezone('Asia/Kolkata')
 class ToolException(Exception):
     pass
 
+async def _get_or_create_patient(db: AsyncSession, patient_email: str) -> Patient:
+    patient = await db.scalar(select(Patient).where(Patient.email == patient_email).limit(1))
+    if patient:
+        return patient
+    logger.warning(f"Patient with email {patient_email} not found. Creating a new patient.")
+    try:
+        async with db.begin_nested():
+            patient = Patient(name=patient_email.split('@')[0], email=patient_email)
+            db.add(patient)
+    except IntegrityError:
+        # A concurrent booking created the same patient first.
+        patient = await db.scalar(select(Patient).where(Patient.email == patient_email).limit(1))
+    return patient
+
 async def book_appointment(
-    db: Session,
+    db: AsyncSession,
     patient_email: str,
     doctor_email: str,
     appointment_time_str: str,
@@ -39,38 +59,34 @@ async def book_appointment(
         end_time = appointment_time + timedelta(minutes=30)
 
 
-        doctor = db.query(Doctor).filter(Doctor.email == doctor_email).first()
+        doctor = await db.scalar(select(Doctor).where(Doctor.email == doctor_email).limit(1))
         if not doctor:
             result["status"] = "error"
             result["message"] = f"Doctor with email {doctor_email} not found."
             return result
         
-        availability_slot = db.query(DoctorAvailability).filter(
-            DoctorAvailability.doctor_id == doctor.id,
-            DoctorAvailability.start_time == naive_appointment_time,
-            DoctorAvailability.is_booked == False  
-        ).first()
-
-        if not availability_slot:
+        # A fresh slot index turns away taken or unknown slots without touching the database;
+        # the atomic claim below still decides every race.
+        if slot_index.is_open(doctor.id, naive_appointment_time) is False:
             return {"status": "error", "message": f"The requested time slot {appointment_time_str} is not available or already booked."}
 
-        existing_appointment = db.query(Appointment).filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.appointment_time == appointment_time
-        ).first()
-        
-        if existing_appointment:
-            return {"status": "error", "message": f"An appointment already exists at {appointment_time_str}."}
+        patient = await _get_or_create_patient(db, patient_email)
 
-        availability_slot.is_booked = True
-        db.flush()  
-        
-        patient = db.query(Patient).filter(Patient.email == patient_email).first()
-        if not patient:
-            logger.warning(f"Patient with email {patient_email} not found. Creating a new patient.")
-            patient = Patient(name=patient_email.split('@')[0], email=patient_email)
-            db.add(patient)
-            db.flush()  
+        # Claim the slot atomically: under concurrency only one transaction sees is_booked == False.
+        claimed_slot_id = await db.scalar(
+            update(DoctorAvailability).where(
+                DoctorAvailability.doctor_id == doctor.id,
+                DoctorAvailability.start_time == naive_appointment_time,
+                DoctorAvailability.is_booked == False
+            ).values(is_booked=True).returning(DoctorAvailability.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        if claimed_slot_id is None:
+            slot_index.mark(doctor.id, naive_appointment_time, is_open=False)
+            tool_cache.invalidate(AVAILABILITY_TOOLS, doctor_email=doctor.email)
+            await db.rollback()
+            return {"status": "error", "message": f"The requested time slot {appointment_time_str} is not available or already booked."}
 
         appointment = Appointment(
             patient_id=patient.id,
@@ -80,45 +96,185 @@ async def book_appointment(
             status="scheduled"
         )
         db.add(appointment)
-        db.commit()  
-        db.refresh(appointment)
+        try:
+            await db.flush()
+        except IntegrityError:
+            await db.rollback()
+            return {"status": "error", "message": f"An appointment already exists at {appointment_time_str}."}
+
+        await record_appointment_change(db, appointment.id, patient.id, doctor.id, appointment_time_for_db, delta=1)
+
+        email_body = f"Dear {patient.name},\n\nYour appointment with Dr. {doctor.name} on {appointment_time.strftime('%Y-%m-%d at %H:%M %Z')} is confirmed.\n\nAppointment ID: {appointment.id}"
+        outbox.enqueue(db, appointment.id, "email", {
+            "to_email": patient.email,
+            "subject": "Your Appointment Confirmation",
+            "body": email_body,
+        })
+        outbox.enqueue(db, appointment.id, "calendar", {
+            "summary": f"Appointment: {patient.name} with Dr. {doctor.name}",
+            "description": f"Reason: {reason or 'N/A'}\nAppointment ID: {appointment.id}",
+            "start_time": appointment_time.isoformat(),
+            "end_time": end_time.isoformat(),
+            "attendees": [patient.email, doctor.email],
+        })
+        await db.commit()  
         
+        slot_index.mark(doctor.id, naive_appointment_time, is_open=False)
+        tool_cache.invalidate(AVAILABILITY_TOOLS, doctor_email=doctor.email)
         logger.info(f"Appointment created with ID: {appointment.id}")
         result["appointment_id"] = appointment.id
-        result["message"] = "Appointment successfully created in database."
 
     except Exception as e:
         logger.error(f"Database error in book_appointment: {e}", exc_info=True)
-        db.rollback()
+        await db.rollback()
         result["status"] = "error"
         result["message"] = f"Database error: {e}"
         return result
 
+    outbox.outbox_workers.notify()
+    result["email_status"] = "queued"
+    result["calendar_event_link"] = "queued"
+    result["message"] = (
+        f"Appointment created with ID {result['appointment_id']}. "
+        "The confirmation email and calendar invite are queued; use get_booking_status to check on them."
+    )
+
+    return result
+
+async def cancel_appointment(db: AsyncSession, appointment_id: int, patient_email: str) -> dict:
+    """
+    Cancels a scheduled appointment, frees its slot, updates the daily statistics and
+    queues a cancellation email. Only the patient who booked it (`patient_email`) can
+    cancel an appointment.
+    """
+    if not patient_email or not patient_email.strip():
+        return {"status": "error", "message": "The patient's email is required to cancel an appointment."}
     try:
-        email_subject = "Your Appointment Confirmation"
-        email_body = f"Dear {patient.name},\n\nYour appointment with Dr. {doctor.name} on {appointment_time.strftime('%Y-%m-%d at %H:%M %Z')} is confirmed.\n\nAppointment ID: {appointment.id}"
-        if await send_email(patient.email, email_subject, email_body):
-            result["email_status"] = "Email sent successfully."
-        else:
-            result["email_status"] = "Email sending failed."
+        owner = select(Patient.id).where(Patient.email == patient_email.strip()).scalar_subquery()
+        # Like the slot claim in book_appointment, only one concurrent cancellation can match.
+        cancelled = (await db.execute(
+            update(Appointment).where(
+                Appointment.id == appointment_id,
+                Appointment.patient_id == owner,
+                Appointment.status != "cancelled",
+            ).values(status="cancelled")
+            .returning(Appointment.patient_id, Appointment.doctor_id, Appointment.appointment_time)
+            .execution_options(synchronize_session=False)
+        )).first()
+        if cancelled is None:
+            await db.rollback()
+            # Missing and someone else's appointments get the same answer, so IDs can't be probed.
+            appointment = (await db.execute(
+                select(Appointment.status).where(Appointment.id == appointment_id, Appointment.patient_id == owner)
+            )).first()
+            if appointment is None:
+                return {"status": "error", "message": f"No appointment {appointment_id} found for {patient_email}."}
+            return {"status": "error", "message": f"Appointment {appointment_id} is already cancelled."}
+
+        await db.execute(
+            update(DoctorAvailability).where(
+                DoctorAvailability.doctor_id == cancelled.doctor_id,
+                DoctorAvailability.start_time == cancelled.appointment_time
+            ).values(is_booked=False).execution_options(synchronize_session=False)
+        )
+        await record_appointment_change(
+            db, appointment_id, cancelled.patient_id, cancelled.doctor_id, cancelled.appointment_time, delta=-1
+        )
+
+        patient = await db.get(Patient, cancelled.patient_id)
+        doctor = await db.get(Doctor, cancelled.doctor_id)
+        outbox.enqueue(db, appointment_id, "email", {
+            "to_email": patient.email,
+            "subject": "Your Appointment Cancellation",
+            "body": (
+                f"Dear {patient.name},\n\nYour appointment with Dr. {doctor.name} on "
+                f"{cancelled.appointment_time.strftime('%Y-%m-%d at %H:%M')} IST has been cancelled.\n\n"
+                f"Appointment ID: {appointment_id}"
+            ),
+        })
+        await db.commit()
+        slot_index.mark(cancelled.doctor_id, cancelled.appointment_time, is_open=True)
+        tool_cache.invalidate(AVAILABILITY_TOOLS, doctor_email=doctor.email)
+        logger.info(f"Appointment {appointment_id} cancelled.")
     except Exception as e:
-        result["email_status"] = f"Email error: {e}"
-        
+        logger.error(f"Database error in cancel_appointment: {e}", exc_info=True)
+        await db.rollback()
+        return {"status": "error", "message": f"Database error: {e}"}
+
+    outbox.outbox_workers.notify()
+    return {
+        "status": "success",
+        "appointment_id": appointment_id,
+        "message": f"Appointment {appointment_id} has been cancelled and the time slot is open again.",
+    }
+
+async def get_booking_status(db: AsyncSession, appointment_id: int) -> dict:
+    """Returns an appointment's status together with the delivery state of its side effects."""
     try:
-        event_summary = f"Appointment: {patient.name} with Dr. {doctor.name}"
-        event_description = f"Reason: {reason or 'N/A'}\nAppointment ID: {appointment.id}"
-        calendar_link = await create_event(
-            summary=event_summary, 
-            description=event_description, 
-            start_time=appointment_time,
-            end_time=end_time, 
-            attendees=[patient.email, doctor.email]
-        )
-        result["calendar_event_link"] = calendar_link or "Failed to create calendar event."
+        appointment = await db.get(Appointment, appointment_id)
+        if not appointment:
+            return {"status": "error", "message": f"Appointment {appointment_id} not found."}
+
+        events = (await db.scalars(
+            select(OutboxEvent).where(OutboxEvent.appointment_id == appointment_id).order_by(OutboxEvent.id)
+        )).all()
+        side_effects = [{
+            "type": event.event_type,
+            "status": event.status,
+            "attempts": event.attempts,
+            "result": event.result,
+            "last_error": event.last_error,
+        } for event in events]
+
+        summary = ", ".join(f"{effect['type']}: {effect['status']}" for effect in side_effects) or "no side effects recorded"
+        return {
+            "status": "success",
+            "appointment_id": appointment.id,
+            "appointment_status": appointment.status,
+            "side_effects": side_effects,
+            "message": f"Appointment {appointment.id} is {appointment.status} ({summary}).",
+        }
     except Exception as e:
-        result["calendar_event_link"] = f"Calendar error: {e}"
+        logger.error(f"Error in get_booking_status: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
 
-    full_message = f"Appointment created with ID {result['appointment_id']}. Email: {result['email_status']}. Calendar: {result['calendar_event_link']}"
-    result["message"] = full_message
+async def send_appointment_reminders(db: AsyncSession, target_date_str: Optional[str] = None) -> dict:
+    """Emails a reminder to every patient with a scheduled appointment on the target date (default: tomorrow)."""
+    try:
+        target_date = datetime.strptime(target_date_str, "%Y-%m-%d").date() if target_date_str else date.today() + timedelta(days=1)
+        start_of_day = datetime.combine(target_date, datetime.min.time())
+        end_of_day = datetime.combine(target_date, datetime.max.time())
 
-    return result
\ No newline at end of file
+        appointments = (await db.scalars(
+            select(Appointment)
+            .join(Appointment.patient).join(Appointment.doctor)
+            .options(contains_eager(Appointment.patient), contains_eager(Appointment.doctor))
+            .where(
+                Appointment.appointment_time >= start_of_day,
+                Appointment.appointment_time <= end_of_day,
+                Appointment.status == "scheduled"
+            ).order_by(Appointment.appointment_time)
+        )).all()
+
+        if not appointments:
+            return {"status": "success", "message": f"No scheduled appointments on {target_date.strftime('%Y-%m-%d')}.", "sent": 0, "failed": 0}
+
+        messages = [(
+            appt.patient.email,
+            "Appointment Reminder",
+            f"Dear {appt.patient.name},\n\nThis is a reminder of your appointment with Dr. {appt.doctor.name} "
+            f"on {appt.appointment_time.strftime('%Y-%m-%d at %H:%M')} IST.\n\nAppointment ID: {appt.id}"
+        ) for appt in appointments]
+        results = await send_emails(messages)
+
+        sent = sum(results)
+        logger.info(f"Sent {sent}/{len(results)} reminders for {target_date}.")
+        return {
+            "status": "success",
+            "message": f"Sent {sent} of {len(results)} reminders for {target_date.strftime('%Y-%m-%d')}.",
+            "sent": sent,
+            "failed": len(results) - sent
+        }
+    except Exception as e:
+        logger.error(f"Error in send_appointment_reminders: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
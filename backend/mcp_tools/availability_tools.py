@@ -1,46 +1,65 @@
 # backend/mcp_tools/availability_tools.py
-from datetime import datetime, date
-from typing import Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from datetime import datetime, date, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import pytz
 
-from backend.models import Doctor, DoctorAvailability
-from backend.services.google_calendar import check_availability as gc_check_availability
+from backend.models import DoctorAvailability
+from backend.services.doctor_directory import doctor_directory
+from backend.services.slot_index import slot_index
+from backend.services.google_calendar import get_busy_intervals as gc_get_busy_intervals, is_slot_free as gc_is_slot_free
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 IST = pytz.timezone('Asia/Kolkata')
+MAX_SEARCH_DAYS = 31
 
 class ToolException(Exception): ...
 
-async def check_doctor_availability(db: Session, doctor_name_or_email: str, target_date_str: Optional[str] = None) -> dict:
+async def _open_slots(db: AsyncSession, doctor_id: int, day: date) -> List[Tuple[datetime, datetime]]:
+    """A day's open (start, end) slots from the slot index, or from the database past the index's window."""
+    await slot_index.ensure_loaded(db, doctor_id)
+    slots = slot_index.open_slots(doctor_id, day)
+    if slots is not None:
+        return slots
+    rows = (await db.execute(select(DoctorAvailability.start_time, DoctorAvailability.end_time).where(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date == day,
+        DoctorAvailability.is_booked == False
+    ).order_by(DoctorAvailability.start_time))).all()
+    return [(start_time, end_time) for start_time, end_time in rows]
+
+async def _calendar_free_slots(doctor_email: str, slots: List[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """The slots that are also free in the doctor's Google Calendar, checked with one freebusy call."""
+    window_start = IST.localize(min(start_time for start_time, _ in slots))
+    window_end = IST.localize(max(end_time for _, end_time in slots))
+    busy_by_calendar = await gc_get_busy_intervals([doctor_email], window_start, window_end)
+    if busy_by_calendar is None:
+        return []
+    busy_intervals = busy_by_calendar.get(doctor_email, [])
+    return [
+        (start_time, end_time) for start_time, end_time in slots
+        if gc_is_slot_free(busy_intervals, IST.localize(start_time), IST.localize(end_time))
+    ]
+
+async def check_doctor_availability(db: AsyncSession, doctor_name_or_email: str, target_date_str: Optional[str] = None) -> dict:
     try:
-        search_term = doctor_name_or_email.replace("Dr. ", "").strip()
-        doctor = db.query(Doctor).filter(or_(Doctor.name.ilike(f"%{search_term}%"), Doctor.email == doctor_name_or_email)).first()
+        await doctor_directory.ensure_loaded(db)
+        doctor = doctor_directory.find(doctor_name_or_email)
         if not doctor:
             raise ToolException(f"Doctor '{doctor_name_or_email}' not found.")
 
         target_date = datetime.strptime(target_date_str, "%Y-%m-%d").date() if target_date_str else date.today()
 
-        availabilities = db.query(DoctorAvailability).filter(
-            DoctorAvailability.doctor_id == doctor.id,
-            DoctorAvailability.date == target_date,
-            DoctorAvailability.is_booked == False
-        ).order_by(DoctorAvailability.start_time).all()
+        availabilities = await _open_slots(db, doctor.id, target_date)
 
         if not availabilities:
             return {"status": "success", "message": f"Dr. {doctor.name} has no scheduled availability on {target_date.strftime('%Y-%m-%d')}."}
 
-        available_slots = []
-        for slot in availabilities:
-            start_time_aware = IST.localize(slot.start_time)
-            end_time_aware = IST.localize(slot.end_time)
-            
-            if await gc_check_availability(doctor.email, start_time_aware, end_time_aware):
-                available_slots.append(slot.start_time.strftime("%H:%M:%S")) # Append the string directly
+        available_slots = [start_time.strftime("%H:%M:%S") for start_time, _ in await _calendar_free_slots(doctor.email, availabilities)]
         
         if not available_slots:
             return {"status": "success", "message": f"Dr. {doctor.name} has no available slots on {target_date.strftime('%Y-%m-%d')} after checking the calendar."}
@@ -52,3 +71,39 @@ async def check_doctor_availability(db: Session, doctor_name_or_email: str, targ
     except Exception as e:
         logger.error(f"An error in check_doctor_availability: {e}", exc_info=True)
         raise e
+
+async def find_next_available_slot(db: AsyncSession, doctor_name_or_email: str, days: int = 7, from_date_str: Optional[str] = None) -> dict:
+    """The earliest slot in the next `days` days that is open in the schedule and free in the doctor's calendar."""
+    try:
+        await doctor_directory.ensure_loaded(db)
+        doctor = doctor_directory.find(doctor_name_or_email)
+        if not doctor:
+            raise ToolException(f"Doctor '{doctor_name_or_email}' not found.")
+
+        first_day = datetime.strptime(from_date_str, "%Y-%m-%d").date() if from_date_str else date.today()
+        days = max(1, min(days, MAX_SEARCH_DAYS))
+        # appointment times are naive IST wall-clock times.
+        now = datetime.now(IST).replace(tzinfo=None)
+
+        candidates = []
+        for offset in range(days):
+            candidates.extend(
+                (start_time, end_time) for start_time, end_time in await _open_slots(db, doctor.id, first_day + timedelta(days=offset))
+                if start_time > now
+            )
+        free_slots = await _calendar_free_slots(doctor.email, candidates) if candidates else []
+
+        last_day = (first_day + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        if not free_slots:
+            return {"status": "success", "message": f"Dr. {doctor.name} has no available slots from {first_day.strftime('%Y-%m-%d')} to {last_day}."}
+
+        start_time, _ = free_slots[0]
+        return {
+            "status": "success", "doctor_name": doctor.name, "doctor_email": doctor.email,
+            "date": start_time.strftime("%Y-%m-%d"), "time": start_time.strftime("%H:%M:%S"),
+            "appointment_time_str": start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "message": f"The next available slot with {doctor.name} is {start_time.strftime('%Y-%m-%d at %H:%M')} IST."
+        }
+    except Exception as e:
+        logger.error(f"An error in find_next_available_slot: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
@@ -1,8 +1,8 @@
 # backend/mcp_tools/doctor_tools.py
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from backend.models import Doctor
+from backend.services.doctor_directory import doctor_directory
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -12,7 +12,7 @@ class ToolException(Exception):
     """Custom exception for tool-related errors."""
     pass
 
-async def get_doctors_by_specialty(db: Session, specialty: str) -> dict:
+async def get_doctors_by_specialty(db: AsyncSession, specialty: str) -> dict:
     """
     Retrieves a list of doctors by their specialty.
     """
@@ -20,11 +20,8 @@ async def get_doctors_by_specialty(db: Session, specialty: str) -> dict:
         if not specialty:
             raise ToolException("Specialty must be provided.")
         
-        search_term = specialty
-        if search_term.lower().endswith('ist'):
-            search_term = search_term[:-3]
-        
-        doctors = db.query(Doctor).filter(Doctor.specialty.ilike(f"%{search_term}%")).all()
+        await doctor_directory.ensure_loaded(db)
+        doctors = [doctor for doctor, _ in doctor_directory.search_by_specialty(specialty)]
 
         if not doctors:
             return {"status": "success", "message": f"No doctors found with the specialty '{specialty}'."}
@@ -41,7 +38,7 @@ async def get_doctors_by_specialty(db: Session, specialty: str) -> dict:
         logger.error(f"An error occurred in get_doctors_by_specialty: {e}", exc_info=True)
         return {"status": "error", "message": str(e)}
 
-async def get_doctor_details_by_name(db: Session, doctor_name: str) -> dict:
+async def get_doctor_details_by_name(db: AsyncSession, doctor_name: str) -> dict:
     """
     Retrieves the details (like specialty) for a single doctor by their name.
     """
@@ -49,8 +46,9 @@ async def get_doctor_details_by_name(db: Session, doctor_name: str) -> dict:
         if not doctor_name:
             raise ToolException("Doctor name must be provided.")
 
-        search_term = doctor_name.replace("Dr. ", "").strip()
-        doctor = db.query(Doctor).filter(Doctor.name.ilike(f"%{search_term}%")).first()
+        await doctor_directory.ensure_loaded(db)
+        matches = doctor_directory.search_by_name(doctor_name, limit=1)
+        doctor = matches[0][0] if matches else None
 
         if not doctor:
             return {"status": "success", "message": f"No doctor found with the name '{doctor_name}'."}
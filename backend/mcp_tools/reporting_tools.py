@@ -1,11 +1,15 @@
-from datetime import datetime, date
-from typing import Optional
-from sqlalchemy.orm import Session
-from sqlalchemy.orm import joinedload
-from sqlalchemy import func, cast, Date
+from collections import defaultdict
+from datetime import datetime, date, time, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from sqlalchemy import select
+import os
 import pytz
 
-from backend.models import Appointment, Patient, Doctor
+from backend.models import Appointment, Patient
+from backend.services.daily_stats import ACTIVE_APPOINTMENT, get_day_counts
+from backend.services.doctor_directory import doctor_directory
 from backend.services.slack_notifier import send_slack_message
 import logging
 
@@ -13,30 +17,45 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 IST = pytz.timezone('Asia/Kolkata')
+REPORT_MAX_DAYS = int(os.getenv("REPORT_MAX_DAYS", "31"))
 
 class ToolException(Exception): ...
 
+def _parse_date(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ToolException(f"Invalid date '{value}'. Please use YYYY-MM-DD.")
+
+async def _fetch_appointments(db: AsyncSession, doctor_ids: List[int], start_date: date, end_date: date) -> List[Appointment]:
+    """
+    Every active (not cancelled) appointment of `doctor_ids` from start_date to end_date
+    (inclusive), with its patient loaded by the same joined query, ordered by doctor and
+    time. Counting only these keeps reports in line with the daily stats counters.
+    """
+    # appointment_time is stored as naive IST wall-clock time.
+    range_start = datetime.combine(start_date, time.min)
+    range_end = datetime.combine(end_date + timedelta(days=1), time.min)
+    return (await db.scalars(
+        select(Appointment).join(Appointment.patient).options(contains_eager(Appointment.patient)).where(
+            Appointment.doctor_id.in_(doctor_ids),
+            Appointment.appointment_time >= range_start,
+            Appointment.appointment_time < range_end,
+            ACTIVE_APPOINTMENT
+        ).order_by(Appointment.doctor_id, Appointment.appointment_time)
+    )).all()
 
-async def get_appointments_summary_for_doctor(db: Session, doctor_email: str, target_date_str: Optional[str] = None) -> dict:
+
+async def get_appointments_summary_for_doctor(db: AsyncSession, doctor_email: str, target_date_str: Optional[str] = None) -> dict:
     logger.info(f"DEBUG: Starting appointment summary for {doctor_email} on {target_date_str}")
     try:
-        doctor = db.query(Doctor).filter(Doctor.email == doctor_email).first()
+        await doctor_directory.ensure_loaded(db)
+        doctor = doctor_directory.get_by_email(doctor_email)
         if not doctor:
             raise ToolException(f"Doctor with email {doctor_email} not found.")
 
-        target_date = datetime.strptime(target_date_str, "%Y-%m-%d").date() if target_date_str else date.today()
-
-        start_of_day = datetime.combine(target_date, datetime.min.time())
-        end_of_day = datetime.combine(target_date, datetime.max.time())
-        
-        start_of_day_ist = IST.localize(start_of_day)
-        end_of_day_ist = IST.localize(end_of_day)
-
-        appointments = db.query(Appointment).join(Patient).filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.appointment_time >= start_of_day_ist,
-            Appointment.appointment_time <= end_of_day_ist
-        ).order_by(Appointment.appointment_time).all()
+        target_date = _parse_date(target_date_str) if target_date_str else date.today()
+        appointments = await _fetch_appointments(db, [doctor.id], target_date, target_date)
 
         doctor_name = doctor.name.replace("Dr. ", "").strip()
 
@@ -56,14 +75,9 @@ async def get_appointments_summary_for_doctor(db: Session, doctor_email: str, ta
                 patient_name = appt.patient.name
                 patient_email = appt.patient.email
             else:
-                patient = db.query(Patient).filter(Patient.id == appt.patient_id).first()
-                if patient:
-                    patient_name = patient.name
-                    patient_email = patient.email
-                else:
-                    patient_name = "Unknown Patient"
-                    patient_email = "N/A"
-                    logger.warning(f"Patient not found for appointment {appt.id} with patient_id {appt.patient_id}")
+                patient_name = "Unknown Patient"
+                patient_email = "N/A"
+                logger.warning(f"Patient not found for appointment {appt.id} with patient_id {appt.patient_id}")
                 
             summary_lines.append(
                 f"{i+1}. Time: {appt_time_ist.strftime('%H:%M')} IST, "
@@ -82,24 +96,118 @@ async def get_appointments_summary_for_doctor(db: Session, doctor_email: str, ta
     except Exception as e:
         logger.error(f"Error in get_appointments_summary_for_doctor: {e}", exc_info=True)
         return {"status": "error", "message": str(e)}
-    
-async def get_patient_count_by_date(db: Session, target_date_str: str) -> dict:
+
+async def get_appointments_report(
+    db: AsyncSession,
+    start_date_str: str,
+    end_date_str: Optional[str] = None,
+    doctor_emails: Optional[List[str]] = None,
+    specialty: Optional[str] = None,
+    send_to_slack: bool = False,
+) -> dict:
+    """
+    Appointments for a set of doctors and/or a whole specialty over a date range, grouped
+    per doctor and per day. All appointments and their patients come from one query.
+    """
+    try:
+        start_date = _parse_date(start_date_str)
+        end_date = _parse_date(end_date_str) if end_date_str else start_date
+        if end_date < start_date:
+            raise ToolException("end_date_str must not be before start_date_str.")
+        if (end_date - start_date).days >= REPORT_MAX_DAYS:
+            raise ToolException(f"Reports can cover at most {REPORT_MAX_DAYS} days.")
+        if not doctor_emails and not specialty:
+            raise ToolException("Provide doctor_emails, a specialty, or both.")
+
+        await doctor_directory.ensure_loaded(db)
+        doctors = {}
+        for email in doctor_emails or []:
+            doctor = doctor_directory.get_by_email(email)
+            if not doctor:
+                raise ToolException(f"Doctor with email {email} not found.")
+            doctors[doctor.id] = doctor
+        if specialty:
+            doctors.update((doctor.id, doctor) for doctor, _ in doctor_directory.search_by_specialty(specialty))
+        if not doctors:
+            return {"status": "success", "message": f"No doctors found with the specialty '{specialty}'.", "doctors": []}
+
+        appointments = await _fetch_appointments(db, list(doctors), start_date, end_date)
+        by_doctor_day: Dict[int, Dict[date, List[Appointment]]] = defaultdict(lambda: defaultdict(list))
+        for appt in appointments:
+            by_doctor_day[appt.doctor_id][appt.appointment_time.date()].append(appt)
+
+        period = start_date.isoformat() if start_date == end_date else f"{start_date.isoformat()} to {end_date.isoformat()}"
+        summary_lines = [f"Appointment Report ({period}): {len(appointments)} appointments across {len(doctors)} doctors"]
+        doctor_reports = []
+        for doctor in sorted(doctors.values(), key=lambda d: d.name):
+            days = sorted(by_doctor_day.get(doctor.id, {}).items())
+            day_reports = [
+                {
+                    "date": day.isoformat(),
+                    "appointment_count": len(day_appointments),
+                    "appointments": [
+                        {
+                            "id": appt.id,
+                            "time": appt.appointment_time.strftime("%H:%M"),
+                            "patient_name": appt.patient.name,
+                            "patient_email": appt.patient.email,
+                            "reason": appt.reason,
+                            "status": appt.status,
+                        }
+                        for appt in day_appointments
+                    ],
+                }
+                for day, day_appointments in days
+            ]
+            appointment_count = sum(day_report["appointment_count"] for day_report in day_reports)
+            doctor_reports.append({
+                "doctor_name": doctor.name,
+                "doctor_email": doctor.email,
+                "specialty": doctor.specialty,
+                "appointment_count": appointment_count,
+                "days": day_reports,
+            })
+            per_day = ", ".join(f"{day_report['date']}: {day_report['appointment_count']}" for day_report in day_reports)
+            summary_lines.append(f"- {doctor.name} ({doctor.specialty}): {appointment_count}" + (f" ({per_day})" if per_day else ""))
+
+        full_summary = "\n".join(summary_lines)
+        if send_to_slack:
+            await send_slack_message(full_summary)
+        return {
+            "status": "success",
+            "message": full_summary,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "appointment_count": len(appointments),
+            "doctors": doctor_reports,
+        }
+    except Exception as e:
+        logger.error(f"Error in get_appointments_report: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+async def get_patient_count_by_date(db: AsyncSession, target_date_str: str, doctor_email: Optional[str] = None) -> dict:
+    """Distinct patients and appointments on a day, clinic-wide or for one doctor, read from the daily stats tables."""
     try:
         target_date = datetime.strptime(target_date_str, "%Y-%m-%d").date()
-        patient_count = db.query(func.count(func.distinct(Appointment.patient_id))).filter(
-            cast(Appointment.appointment_time.op('AT TIME ZONE')('Asia/Kolkata'), Date) == target_date
-        ).scalar()
-        message = f"On {target_date_str}, there are {patient_count} unique patients with appointments."
+        doctor = None
+        if doctor_email:
+            await doctor_directory.ensure_loaded(db)
+            doctor = doctor_directory.get_by_email(doctor_email)
+            if not doctor:
+                raise ToolException(f"Doctor with email {doctor_email} not found.")
+        appointment_count, patient_count = await get_day_counts(db, target_date, doctor.id if doctor else None)
+        scope = f" with {doctor.name}" if doctor else ""
+        message = f"On {target_date_str}, there are {patient_count} unique patients with appointments{scope} ({appointment_count} appointments)."
         logger.info(message)
-        return {"status": "success", "message": message, "patient_count": patient_count}
+        return {"status": "success", "message": message, "patient_count": patient_count, "appointment_count": appointment_count}
     except ValueError:
         raise ToolException("Invalid date format. Please use YYYY-MM-DD.")
     except Exception as e:
         return {"status": "error", "message": f"An unexpected error occurred: {e}"}
 
-async def get_patients_with_condition(db: Session, condition: str) -> dict:
+async def get_patients_with_condition(db: AsyncSession, condition: str) -> dict:
     try:
-        patients = db.query(Patient).filter(Patient.condition.ilike(f"%{condition}%")).all()
+        patients = (await db.scalars(select(Patient).where(Patient.condition.ilike(f"%{condition}%")))).all()
         if not patients:
             return {"status": "success", "message": f"No patients found with condition '{condition}'."}
         results = [{"patient_name": p.name, "patient_email": p.email, "condition": p.condition} for p in patients]
@@ -0,0 +1,126 @@
+# backend/migrations/__init__.py
+"""
+Versioned schema migrations.
+
+Each module in this package named `vNNNN_<description>.py` is one migration and
+defines `upgrade(conn)`. Migrations run in version order, each in its own
+transaction, and applied versions are recorded in the `schema_migrations` table.
+On PostgreSQL an advisory lock keeps concurrently starting instances from running
+the same migration twice.
+
+A fresh database gets the current schema from `create_all` and is stamped with every
+migration without running them. An existing database runs its pending migrations
+first, and `create_all` only adds the tables no migration creates. Either way a
+migration runs against the schema exactly as the previous version left it, so write
+each one against that schema in plain SQL, not against the current models or
+services, and don't change it once it is released.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = "schema_migrations"
+ADVISORY_LOCK_KEY = 4286001
+_MODULE_PATTERN = re.compile(r"^v(\d{4})_(\w+)$")
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+def discover() -> List[Migration]:
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_PATTERN.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(Migration(version=int(match.group(1)), name=match.group(2), upgrade=module.upgrade))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {versions}")
+    return migrations
+
+def _ensure_table(conn: Connection):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+def applied_versions(conn: Connection) -> Set[int]:
+    _ensure_table(conn)
+    return {row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+def _record(conn: Connection, migration: Migration):
+    conn.execute(
+        text(f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (:version, :name)"),
+        {"version": migration.version, "name": migration.name},
+    )
+
+def upgrade(engine: Engine, target: Optional[int] = None, metadata: Optional[MetaData] = None) -> List[int]:
+    """
+    Applies pending migrations up to `target` (default: latest) and returns the versions applied.
+    With `metadata`, its missing tables are created afterwards; if the database had no tables
+    at all, they are created instead and every migration is recorded as applied, not run.
+    """
+    applied: List[int] = []
+    with engine.connect() as conn:
+        is_postgres = conn.dialect.name == "postgresql"
+        if is_postgres:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            conn.commit()
+        try:
+            # Decided under the lock, so an instance starting alongside one that is creating
+            # the schema doesn't take the new tables for an old database to migrate.
+            with conn.begin():
+                fresh = metadata is not None and not inspect(conn).get_table_names()
+                if fresh:
+                    metadata.create_all(conn)
+                    _ensure_table(conn)
+                    for migration in discover():
+                        _record(conn, migration)
+            if fresh:
+                logger.info("Created the database schema; all migrations are marked as applied.")
+                return applied
+            with conn.begin():
+                done = applied_versions(conn)
+            for migration in discover():
+                if migration.version in done or (target is not None and migration.version > target):
+                    continue
+                logger.info(f"Applying migration {migration.version:04d}_{migration.name}...")
+                with conn.begin():
+                    migration.upgrade(conn)
+                    _record(conn, migration)
+                applied.append(migration.version)
+            if metadata is not None:
+                with conn.begin():
+                    metadata.create_all(conn)
+        finally:
+            if is_postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                conn.commit()
+    if applied:
+        logger.info(f"Applied migrations: {applied}")
+    else:
+        logger.info("Database schema is up to date.")
+    return applied
+
+def status(engine: Engine) -> List[dict]:
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    return [
+        {"version": migration.version, "name": migration.name, "applied": migration.version in done}
+        for migration in discover()
+    ]
@@ -0,0 +1,35 @@
+# backend/migrations/__main__.py
+"""
+    python -m backend.migrations upgrade   # apply pending migrations
+    python -m backend.migrations status    # list migrations and whether they are applied
+    python -m backend.migrations explain   # check the tool queries' plans use the indexes
+"""
+import sys
+
+from backend.database import Base, engine
+from backend.migrations import status, upgrade
+from backend.migrations.explain import check_query_plans
+
+def main(argv) -> int:
+    command = argv[1] if len(argv) > 1 else "upgrade"
+    if command == "upgrade":
+        from backend import models  # noqa: F401 - registers the tables on Base.metadata
+        upgrade(engine, metadata=Base.metadata)
+    elif command == "status":
+        for migration in status(engine):
+            mark = "x" if migration["applied"] else " "
+            print(f"[{mark}] {migration['version']:04d}_{migration['name']}")
+    elif command == "explain":
+        results = check_query_plans(engine)
+        for result in results:
+            print(f"{'OK  ' if result['ok'] else 'MISS'} {result['name']} -> {', '.join(result['indexes_used']) or 'no expected index'}")
+            for line in result["plan"].splitlines():
+                print(f"      {line}")
+        return 0 if all(result["ok"] for result in results) else 1
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
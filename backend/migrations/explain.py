@@ -0,0 +1,85 @@
+# backend/migrations/explain.py
+"""
+EXPLAIN-based check that the tool query shapes are served by the indexes from
+the migrations. On PostgreSQL sequential scans are disabled for the check, so
+a small development table still reports which index the planner *can* use.
+"""
+from datetime import date, datetime, time
+from typing import List
+
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from backend.models import Appointment, DoctorAvailability, Patient
+
+def _hot_queries() -> List[dict]:
+    day = date.today()
+    start_of_day = datetime.combine(day, time.min)
+    end_of_day = datetime.combine(day, time.max)
+    return [
+        {
+            "name": "check_doctor_availability: open slots for a doctor and day",
+            "statement": select(DoctorAvailability).where(
+                DoctorAvailability.doctor_id == 1,
+                DoctorAvailability.date == day,
+                DoctorAvailability.is_booked == False,
+            ).order_by(DoctorAvailability.start_time),
+            "indexes": {"ix_doctor_availabilities_open_slots", "ix_doctor_availabilities_doctor_date_booked"},
+        },
+        {
+            "name": "book_appointment: claim a slot by doctor and start time",
+            "statement": update(DoctorAvailability).where(
+                DoctorAvailability.doctor_id == 1,
+                DoctorAvailability.start_time == start_of_day,
+                DoctorAvailability.is_booked == False,
+            ).values(is_booked=True).returning(DoctorAvailability.id),
+            "indexes": {"uq_doctor_availabilities_doctor_start", "ix_doctor_availabilities_open_slots"},
+        },
+        {
+            "name": "get_appointments_summary_for_doctor: a doctor's appointments in a day",
+            "statement": select(Appointment).join(Appointment.patient).where(
+                Appointment.doctor_id == 1,
+                Appointment.appointment_time >= start_of_day,
+                Appointment.appointment_time <= end_of_day,
+            ).order_by(Appointment.appointment_time),
+            "indexes": {"ix_appointments_doctor_time"},
+        },
+        {
+            "name": "get_appointments_report: several doctors' appointments over a date range",
+            "statement": select(Appointment).join(Appointment.patient).where(
+                Appointment.doctor_id.in_([1, 2, 3]),
+                Appointment.appointment_time >= start_of_day,
+                Appointment.appointment_time < end_of_day,
+            ).order_by(Appointment.doctor_id, Appointment.appointment_time),
+            "indexes": {"ix_appointments_doctor_time"},
+        },
+        {
+            "name": "book_appointment: patient by email",
+            "statement": select(Patient).where(Patient.email == "patient@example.com").limit(1),
+            "indexes": {"ix_patients_email"},
+        },
+    ]
+
+def _explain(conn: Connection, statement) -> str:
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.exec_driver_sql(prefix + compiled.string, params).fetchall()
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+def check_query_plans(engine: Engine) -> List[dict]:
+    """Returns one entry per hot query with its plan and whether an expected index shows up in it."""
+    results = []
+    with engine.connect() as conn:
+        with conn.begin() as transaction:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for query in _hot_queries():
+                plan = _explain(conn, query["statement"])
+                used = sorted(name for name in query["indexes"] if name in plan)
+                results.append({"name": query["name"], "ok": bool(used), "indexes_used": used, "plan": plan})
+            transaction.rollback()
+    return results
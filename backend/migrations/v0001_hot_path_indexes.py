@@ -0,0 +1,65 @@
+# backend/migrations/v0001_hot_path_indexes.py
+"""Composite and partial indexes for the availability, booking and reporting query shapes."""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+def _resolve_duplicates(conn: Connection, false_literal: str):
+    """
+    Before this migration, booking was not atomic, so a database can hold double bookings
+    (and duplicated slots) that the unique indexes below would reject. The earliest
+    appointment for a doctor and time is kept and the later ones are marked cancelled.
+    Of duplicated slots, a booked one (else the earliest) is kept and the rest deleted.
+    Everything changed is logged so the affected patients can be contacted.
+    """
+    duplicates = conn.execute(text(
+        "SELECT a.id, a.doctor_id, a.appointment_time, a.patient_id FROM appointments a "
+        "WHERE a.status <> 'cancelled' AND EXISTS ("
+        "SELECT 1 FROM appointments b WHERE b.doctor_id = a.doctor_id "
+        "AND b.appointment_time = a.appointment_time AND b.status <> 'cancelled' AND b.id < a.id) "
+        "ORDER BY a.doctor_id, a.appointment_time, a.id"
+    )).all()
+    for row in duplicates:
+        logger.warning(
+            f"Cancelling double-booked appointment {row.id} (patient {row.patient_id}, doctor {row.doctor_id}, "
+            f"{row.appointment_time}); the earliest booking for that slot is kept."
+        )
+    if duplicates:
+        conn.execute(
+            text("UPDATE appointments SET status = 'cancelled' WHERE id IN (" + ", ".join(str(row.id) for row in duplicates) + ")")
+        )
+
+    a_booked, b_booked = (f"COALESCE({alias}.is_booked, {false_literal})" for alias in ("a", "b"))
+    extra_slots = conn.execute(text(
+        "SELECT a.id FROM doctor_availabilities a WHERE EXISTS ("
+        "SELECT 1 FROM doctor_availabilities b WHERE b.doctor_id = a.doctor_id AND b.start_time = a.start_time "
+        f"AND (({b_booked} AND NOT {a_booked}) OR ({b_booked} = {a_booked} AND b.id < a.id)))"
+    )).scalars().all()
+    if extra_slots:
+        logger.warning(f"Deleting {len(extra_slots)} duplicated availability slot(s): {extra_slots}")
+        conn.execute(text("DELETE FROM doctor_availabilities WHERE id IN (" + ", ".join(map(str, extra_slots)) + ")"))
+
+def upgrade(conn: Connection):
+    false_literal = "false" if conn.dialect.name == "postgresql" else "0"
+    _resolve_duplicates(conn, false_literal)
+    statements = [
+        # check_doctor_availability: doctor_id + date + is_booked, ordered by start_time.
+        "CREATE INDEX IF NOT EXISTS ix_doctor_availabilities_doctor_date_booked "
+        "ON doctor_availabilities (doctor_id, date, is_booked)",
+        "CREATE INDEX IF NOT EXISTS ix_doctor_availabilities_open_slots "
+        f"ON doctor_availabilities (doctor_id, date, start_time) WHERE is_booked = {false_literal}",
+        # book_appointment claims a slot by doctor_id + start_time.
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_doctor_availabilities_doctor_start "
+        "ON doctor_availabilities (doctor_id, start_time)",
+        # Daily summaries filter appointments by doctor_id + appointment_time range.
+        "CREATE INDEX IF NOT EXISTS ix_appointments_doctor_time "
+        "ON appointments (doctor_id, appointment_time)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_appointments_doctor_time_active "
+        "ON appointments (doctor_id, appointment_time) WHERE status <> 'cancelled'",
+        # Patient lookups by email are already served by the unique ix_patients_email.
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
@@ -0,0 +1,45 @@
+# backend/migrations/v0002_daily_stats.py
+"""Daily statistics tables, the patient/time index their maintenance reads, and the initial backfill."""
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+def upgrade(conn: Connection):
+    is_postgres = conn.dialect.name == "postgresql"
+    timestamp = "TIMESTAMP WITHOUT TIME ZONE" if is_postgres else "DATETIME"
+    day = "CAST(appointment_time AS DATE)" if is_postgres else "date(appointment_time)"
+
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS daily_doctor_stats ("
+        "doctor_id INTEGER NOT NULL REFERENCES doctors (id), date DATE NOT NULL, "
+        "appointment_count INTEGER NOT NULL, patient_count INTEGER NOT NULL, "
+        f"updated_at {timestamp}, PRIMARY KEY (doctor_id, date))"
+    ))
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS daily_stats ("
+        "date DATE NOT NULL, appointment_count INTEGER NOT NULL, patient_count INTEGER NOT NULL, "
+        f"updated_at {timestamp}, PRIMARY KEY (date))"
+    ))
+    # record_appointment_change looks up a patient's other appointments on the same day.
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_appointments_patient_time "
+        "ON appointments (patient_id, appointment_time)"
+    ))
+
+    if is_postgres:
+        conn.execute(text("LOCK TABLE daily_doctor_stats, daily_stats IN EXCLUSIVE MODE"))
+    conn.execute(text("DELETE FROM daily_doctor_stats"))
+    conn.execute(text("DELETE FROM daily_stats"))
+    # updated_at is naive UTC.
+    now = {"now": datetime.now(timezone.utc).replace(tzinfo=None)}
+    conn.execute(text(
+        "INSERT INTO daily_doctor_stats (doctor_id, date, appointment_count, patient_count, updated_at) "
+        f"SELECT doctor_id, {day}, COUNT(*), COUNT(DISTINCT patient_id), :now FROM appointments "
+        f"WHERE status <> 'cancelled' GROUP BY doctor_id, {day}"
+    ), now)
+    conn.execute(text(
+        "INSERT INTO daily_stats (date, appointment_count, patient_count, updated_at) "
+        f"SELECT {day}, COUNT(*), COUNT(DISTINCT patient_id), :now FROM appointments "
+        f"WHERE status <> 'cancelled' GROUP BY {day}"
+    ), now)
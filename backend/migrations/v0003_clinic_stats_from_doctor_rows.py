@@ -0,0 +1,23 @@
+# backend/migrations/v0003_clinic_stats_from_doctor_rows.py
+"""
+Clinic-wide daily counts are summed from daily_doctor_stats instead of being kept in
+the single-row-per-day daily_stats table, which every booking had to update.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+def upgrade(conn: Connection):
+    day = "CAST(appointment_time AS DATE)" if conn.dialect.name == "postgresql" else "date(appointment_time)"
+    conn.execute(text(
+        "ALTER TABLE daily_doctor_stats ADD COLUMN clinic_patient_count INTEGER NOT NULL DEFAULT 0"
+    ))
+    # Each of a day's patients counts towards the clinic-wide total once, on their lowest doctor_id's row.
+    conn.execute(text(
+        "UPDATE daily_doctor_stats SET clinic_patient_count = shares.patients FROM ("
+        "SELECT doctor_id, day, COUNT(*) AS patients FROM ("
+        f"SELECT {day} AS day, patient_id, MIN(doctor_id) AS doctor_id FROM appointments "
+        f"WHERE status <> 'cancelled' GROUP BY {day}, patient_id"
+        ") AS firsts GROUP BY doctor_id, day"
+        ") AS shares WHERE shares.doctor_id = daily_doctor_stats.doctor_id AND shares.day = daily_doctor_stats.date"
+    ))
+    conn.execute(text("DROP TABLE daily_stats"))
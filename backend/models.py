@@ -1,9 +1,12 @@
 # backend/models.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Date, Boolean, JSON, Index, text
 from sqlalchemy.orm import relationship
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 from .database import Base
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Doctor(Base):
     __tablename__ = "doctors"
     id = Column(Integer, primary_key=True, index=True)
@@ -36,6 +39,17 @@ class DoctorAvailability(Base):
 
     doctor = relationship("Doctor", back_populates="availabilities")
 
+    __table_args__ = (
+        Index("ix_doctor_availabilities_doctor_date_booked", "doctor_id", "date", "is_booked"),
+        # Open slots are what availability checks read; booked rows never need to be scanned.
+        Index(
+            "ix_doctor_availabilities_open_slots", "doctor_id", "date", "start_time",
+            postgresql_where=text("is_booked = false"),
+            sqlite_where=text("is_booked = 0"),
+        ),
+        Index("uq_doctor_availabilities_doctor_start", "doctor_id", "start_time", unique=True),
+    )
+
 class Appointment(Base):
     __tablename__ = "appointments"
     id = Column(Integer, primary_key=True, index=True)
@@ -46,4 +60,51 @@ class Appointment(Base):
     status = Column(String, default="scheduled")
 
     patient = relationship("Patient", back_populates="appointments")
-    doctor = relationship("Doctor", back_populates="appointments")
\ No newline at end of file
+    doctor = relationship("Doctor", back_populates="appointments")
+    outbox_events = relationship("OutboxEvent", back_populates="appointment")
+
+    __table_args__ = (
+        Index("ix_appointments_doctor_time", "doctor_id", "appointment_time"),
+        Index("ix_appointments_patient_time", "patient_id", "appointment_time"),
+        # At most one live appointment per doctor and time; cancelled ones free the slot again.
+        Index(
+            "uq_appointments_doctor_time_active", "doctor_id", "appointment_time", unique=True,
+            postgresql_where=text("status <> 'cancelled'"),
+            sqlite_where=text("status <> 'cancelled'"),
+        ),
+    )
+
+class DailyDoctorStats(Base):
+    """Per-doctor, per-day appointment counts, maintained incrementally on booking and cancellation."""
+    __tablename__ = "daily_doctor_stats"
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    appointment_count = Column(Integer, default=0, nullable=False)
+    patient_count = Column(Integer, default=0, nullable=False)
+    # This row's share of the day's distinct patients across all doctors: it moves when a
+    # booking here is the patient's first (or a cancellation their last) active appointment
+    # that day with any doctor. Only the sum over a day's rows is meaningful.
+    clinic_patient_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+class OutboxEvent(Base):
+    """A booking side effect (email, calendar event) written in the booking's transaction."""
+    __tablename__ = "outbox_events"
+    id = Column(Integer, primary_key=True, index=True)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), index=True)
+    event_type = Column(String)
+    payload = Column(JSON)
+    status = Column(String, default="pending")
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    next_attempt_at = Column(DateTime, default=utcnow)
+    last_error = Column(String, nullable=True)
+    result = Column(String, nullable=True)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+    appointment = relationship("Appointment", back_populates="outbox_events")
+
+    __table_args__ = (
+        Index("ix_outbox_events_status_next_attempt", "status", "next_attempt_at"),
+    )
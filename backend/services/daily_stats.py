@@ -0,0 +1,139 @@
+# backend/services/daily_stats.py
+"""
+Precomputed per-day appointment and patient counts (DailyDoctorStats).
+
+Booking and cancellation call `record_appointment_change` inside their own
+transaction, so the counters commit or roll back together with the appointment.
+Only the booked doctor's row is written; clinic-wide counts are summed over the
+day's doctor rows when read, so concurrent bookings with different doctors don't
+queue on one shared per-day row. `backfill` rebuilds the table from `appointments`
+and is safe to rerun.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import Date, DateTime, cast, delete, func, insert, literal, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Appointment, DailyDoctorStats, utcnow
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Second key of the two-part advisory lock taken per patient while their counters change.
+PATIENT_LOCK_NAMESPACE = 4286002
+
+ACTIVE_APPOINTMENT = Appointment.status != "cancelled"
+
+def _upsert(dialect_name: str, key: dict, appointment_delta: int, patient_delta: int, clinic_patient_delta: int):
+    insert_for_dialect = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    table = DailyDoctorStats.__table__
+    statement = insert_for_dialect(table).values(
+        **key,
+        appointment_count=appointment_delta,
+        patient_count=patient_delta,
+        clinic_patient_count=clinic_patient_delta,
+        updated_at=utcnow(),
+    )
+    return statement.on_conflict_do_update(
+        index_elements=list(key),
+        set_={
+            "appointment_count": table.c.appointment_count + statement.excluded.appointment_count,
+            "patient_count": table.c.patient_count + statement.excluded.patient_count,
+            "clinic_patient_count": table.c.clinic_patient_count + statement.excluded.clinic_patient_count,
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+
+async def record_appointment_change(
+    db: AsyncSession,
+    appointment_id: int,
+    patient_id: int,
+    doctor_id: int,
+    appointment_time: datetime,
+    delta: int,
+):
+    """
+    Applies one booking (delta=+1, after the appointment is flushed) or cancellation
+    (delta=-1, after its status is set) to the day's counters. The distinct-patient
+    counts only move when this is the patient's first (or last) active appointment
+    that day, overall and with this doctor.
+    """
+    day = appointment_time.date()
+    day_start = datetime.combine(day, time.min)
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        # Serializes a patient's concurrent bookings so the first/last check below is exact.
+        await db.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :patient_id)"),
+            {"namespace": PATIENT_LOCK_NAMESPACE, "patient_id": patient_id},
+        )
+    other_doctor_ids = set((await db.scalars(
+        select(Appointment.doctor_id).where(
+            Appointment.patient_id == patient_id,
+            Appointment.appointment_time >= day_start,
+            Appointment.appointment_time < day_start + timedelta(days=1),
+            Appointment.id != appointment_id,
+            ACTIVE_APPOINTMENT,
+        )
+    )).all())
+
+    await db.execute(_upsert(
+        dialect_name, {"doctor_id": doctor_id, "date": day},
+        delta, 0 if doctor_id in other_doctor_ids else delta, 0 if other_doctor_ids else delta,
+    ))
+
+async def get_day_counts(db: AsyncSession, day: date, doctor_id: Optional[int] = None) -> Tuple[int, int]:
+    """
+    (appointment_count, patient_count) for a day: one doctor's row by primary key, or
+    clinic-wide the sum over that day's doctor rows (at most one per doctor).
+    """
+    if doctor_id is None:
+        statement = select(
+            func.coalesce(func.sum(DailyDoctorStats.appointment_count), 0),
+            func.coalesce(func.sum(DailyDoctorStats.clinic_patient_count), 0),
+        ).where(DailyDoctorStats.date == day)
+    else:
+        statement = select(DailyDoctorStats.appointment_count, DailyDoctorStats.patient_count).where(
+            DailyDoctorStats.doctor_id == doctor_id, DailyDoctorStats.date == day
+        )
+    row = (await db.execute(statement)).first()
+    return (int(row[0]), int(row[1])) if row else (0, 0)
+
+def backfill(conn: Connection) -> dict:
+    """Recomputes the stats table from the appointments table in the caller's transaction."""
+    if conn.dialect.name == "postgresql":
+        # Bookings that commit during the rebuild wait here, then apply their increment to the new rows.
+        conn.execute(text("LOCK TABLE daily_doctor_stats IN EXCLUSIVE MODE"))
+        day = cast(Appointment.appointment_time, Date)
+    else:
+        day = func.date(Appointment.appointment_time)
+    now = literal(utcnow(), DateTime)
+
+    per_doctor = select(
+        Appointment.doctor_id.label("doctor_id"),
+        day.label("date"),
+        func.count().label("appointment_count"),
+        func.count(func.distinct(Appointment.patient_id)).label("patient_count"),
+    ).where(ACTIVE_APPOINTMENT).group_by(Appointment.doctor_id, day).subquery()
+    # Each of a day's patients counts towards the clinic-wide total once, on their lowest doctor_id's row.
+    first_doctor = select(
+        day.label("date"), func.min(Appointment.doctor_id).label("doctor_id"),
+    ).where(ACTIVE_APPOINTMENT).group_by(day, Appointment.patient_id).subquery()
+    clinic_share = select(
+        first_doctor.c.doctor_id, first_doctor.c.date, func.count().label("clinic_patient_count"),
+    ).group_by(first_doctor.c.doctor_id, first_doctor.c.date).subquery()
+
+    conn.execute(delete(DailyDoctorStats))
+    doctor_rows = conn.execute(insert(DailyDoctorStats).from_select(
+        ["doctor_id", "date", "appointment_count", "patient_count", "clinic_patient_count", "updated_at"],
+        select(
+            per_doctor.c.doctor_id, per_doctor.c.date, per_doctor.c.appointment_count, per_doctor.c.patient_count,
+            func.coalesce(clinic_share.c.clinic_patient_count, 0), now,
+        ).outerjoin(clinic_share, (clinic_share.c.doctor_id == per_doctor.c.doctor_id) & (clinic_share.c.date == per_doctor.c.date)),
+    )).rowcount
+    logger.info(f"Backfilled daily stats: {doctor_rows} doctor-days.")
+    return {"doctor_days": doctor_rows}
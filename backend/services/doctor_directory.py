@@ -0,0 +1,190 @@
+# backend/services/doctor_directory.py
+import asyncio
+import bisect
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Doctor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DOCTOR_DIRECTORY_TTL_SECONDS = float(os.getenv("DOCTOR_DIRECTORY_TTL_SECONDS", "300"))
+MIN_SCORE = 0.3
+# Matches scoring below this fraction of the best match are dropped, so "neurology"
+# doesn't also return every specialty that merely shares a few trigrams with it.
+RELATIVE_CUTOFF = 0.85
+PREFIX_SCORE = 0.9
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_TITLE = re.compile(r"^\s*dr\.?\s+", re.IGNORECASE)
+
+@dataclass(frozen=True)
+class DoctorEntry:
+    id: int
+    name: str
+    specialty: str
+    email: str
+    phone_number: Optional[str] = None
+
+def normalize(text: str) -> str:
+    text = _TITLE.sub("", text or "")
+    return " ".join(_NON_ALNUM.sub(" ", text.lower()).split())
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing space."""
+    grams: Set[str] = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+class _FieldIndex:
+    """Token and trigram indexes over one text field, mapping matches back to keys."""
+    def __init__(self, values: Dict[str, str]):
+        self._normalized = {key: normalize(value) for key, value in values.items()}
+        self._trigrams = {key: trigrams(text) for key, text in self._normalized.items()}
+        self._by_trigram: Dict[str, Set[str]] = defaultdict(set)
+        self._by_token: Dict[str, Set[str]] = defaultdict(set)
+        self._by_text: Dict[str, Set[str]] = defaultdict(set)
+        for key, text in self._normalized.items():
+            self._by_text[text].add(key)
+            for gram in self._trigrams[key]:
+                self._by_trigram[gram].add(key)
+            for token in text.split():
+                self._by_token[token].add(key)
+        self._vocabulary = sorted(self._by_token)
+
+    def _keys_with_token_prefix(self, prefix: str) -> Set[str]:
+        keys: Set[str] = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            keys |= self._by_token[token]
+        return keys
+
+    def search(self, query: str) -> List[Tuple[str, float]]:
+        query_text = normalize(query)
+        if not query_text:
+            return []
+        scores: Dict[str, float] = {}
+
+        prefix_matches: Optional[Set[str]] = None
+        for token in query_text.split():
+            keys = self._keys_with_token_prefix(token)
+            prefix_matches = keys if prefix_matches is None else prefix_matches & keys
+        for key in prefix_matches or ():
+            scores[key] = PREFIX_SCORE
+        for key in self._by_text.get(query_text, ()):
+            scores[key] = 1.0
+
+        # Fall back to trigram similarity (typos, "neurologist" vs "neurology") only when
+        # no exact or prefix match exists; that is the expensive part of a lookup.
+        if not scores:
+            query_grams = trigrams(query_text)
+            shared: Dict[str, int] = defaultdict(int)
+            for gram in query_grams:
+                for key in self._by_trigram.get(gram, ()):
+                    shared[key] += 1
+            for key, count in shared.items():
+                scores[key] = count / (len(query_grams) + len(self._trigrams[key]) - count)
+
+        if not scores:
+            return []
+        best = max(scores.values())
+        cutoff = max(MIN_SCORE, best * RELATIVE_CUTOFF)
+        ranked = [(key, score) for key, score in scores.items() if score >= cutoff]
+        ranked.sort(key=lambda item: (-item[1], self._normalized[item[0]]))
+        return ranked
+
+class _DirectorySnapshot:
+    """An immutable, fully indexed copy of the doctors table; swapped in whole on refresh."""
+    def __init__(self, entries: Iterable[DoctorEntry]):
+        self.entries: Dict[int, DoctorEntry] = {entry.id: entry for entry in entries}
+        self.by_email: Dict[str, DoctorEntry] = {entry.email.lower(): entry for entry in self.entries.values() if entry.email}
+        self.doctor_ids_by_specialty: Dict[str, List[int]] = defaultdict(list)
+        for entry in sorted(self.entries.values(), key=lambda e: e.name or ""):
+            self.doctor_ids_by_specialty[entry.specialty or ""].append(entry.id)
+        self.names = _FieldIndex({str(entry.id): entry.name or "" for entry in self.entries.values()})
+        # Specialties repeat across doctors, so only the distinct values are indexed.
+        self.specialties = _FieldIndex({specialty: specialty for specialty in self.doctor_ids_by_specialty})
+
+class DoctorDirectory:
+    """
+    Process-local doctor directory with ranked fuzzy lookups by name and specialty.
+    Loaded from the database on first use, and reloaded after invalidate() (called when
+    this process changes doctors) or once the TTL passes (to pick up other processes' changes).
+    """
+    def __init__(self, ttl_seconds: float = DOCTOR_DIRECTORY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[_DirectorySnapshot] = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._stale = True
+
+    def _needs_reload(self) -> bool:
+        return self._stale or self._snapshot is None or time.monotonic() - self._loaded_at > self.ttl_seconds
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if not self._needs_reload():
+            return
+        async with self._lock:
+            if not self._needs_reload():
+                return
+            self._stale = False
+            rows = (await db.execute(
+                select(Doctor.id, Doctor.name, Doctor.specialty, Doctor.email, Doctor.phone_number)
+            )).all()
+            self._snapshot = _DirectorySnapshot(DoctorEntry(*row) for row in rows)
+            self._loaded_at = time.monotonic()
+            logger.info(f"Doctor directory loaded with {len(self._snapshot.entries)} doctors.")
+
+    def _require_snapshot(self) -> _DirectorySnapshot:
+        if self._snapshot is None:
+            raise RuntimeError("Doctor directory is not loaded; call ensure_loaded() first.")
+        return self._snapshot
+
+    def get_by_email(self, email: str) -> Optional[DoctorEntry]:
+        return self._require_snapshot().by_email.get((email or "").strip().lower())
+
+    def search_by_name(self, query: str, limit: Optional[int] = None) -> List[Tuple[DoctorEntry, float]]:
+        snapshot = self._require_snapshot()
+        matches = [(snapshot.entries[int(key)], score) for key, score in snapshot.names.search(query)]
+        return matches[:limit] if limit else matches
+
+    def search_by_specialty(self, query: str, limit: Optional[int] = None) -> List[Tuple[DoctorEntry, float]]:
+        snapshot = self._require_snapshot()
+        matches = [
+            (snapshot.entries[doctor_id], score)
+            for specialty, score in snapshot.specialties.search(query)
+            for doctor_id in snapshot.doctor_ids_by_specialty[specialty]
+        ]
+        return matches[:limit] if limit else matches
+
+    def specialties(self) -> List[str]:
+        return [specialty for specialty in self._require_snapshot().doctor_ids_by_specialty if specialty]
+
+    def find(self, name_or_email: str) -> Optional[DoctorEntry]:
+        """
+        An email (anything containing "@") must match exactly, ignoring case: a typo'd
+        email must not fuzzy-match some other doctor. Anything else gets the best-ranked
+        name match.
+        """
+        if "@" in (name_or_email or ""):
+            return self.get_by_email(name_or_email)
+        matches = self.search_by_name(name_or_email, limit=1)
+        return matches[0][0] if matches else None
+
+doctor_directory = DoctorDirectory()
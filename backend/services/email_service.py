@@ -1,41 +1,195 @@
 # backend/services/email_service.py
+import asyncio
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
+from typing import Iterable, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 import logging
+from starlette.concurrency import run_in_threadpool
+
+from backend.services.metrics import EXTERNAL_CALL_SECONDS
+from backend.services.tracing import span
 
 load_dotenv()
 
 GMAIL_SENDER = os.getenv("GMAIL_SENDER")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD")
 
+# Point these at a local debug server (e.g. `python -m aiosmtpd -n -l localhost:1025`)
+# with SMTP_USE_SSL=false and no GMAIL_APP_PASSWORD to send without Gmail.
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() in ("1", "true", "yes")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_TIMEOUT_SECONDS = 30
+# Connections idle for longer than this are checked with NOOP before being reused.
+SMTP_IDLE_CHECK_SECONDS = 30
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def send_email(to_email: str, subject: str, body: str) -> bool:
-    """Sends an email using Gmail SMTP. Requires a Gmail App Password."""
-    if not GMAIL_SENDER or not GMAIL_APP_PASSWORD:
+EmailMessage = Tuple[str, str, str]
+
+class SMTPConnectionPool:
+    """A small pool of logged-in SMTP connections shared by the worker threads that send mail."""
+    def __init__(self, host: str, port: int, use_ssl: bool, username: Optional[str], password: Optional[str], size: int):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.size = size
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+            server.ehlo()
+            if self.password and server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
+        if self.password:
+            server.login(self.username, self.password)
+        logger.info(f"Opened SMTP connection to {self.host}:{self.port}")
+        return server
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, released_at = self._idle.pop()
+            if time.monotonic() - released_at < SMTP_IDLE_CHECK_SECONDS:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._discard(server)
+        return self._connect()
+
+    def _checkin(self, server: smtplib.SMTP):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((server, time.monotonic()))
+                return
+        self._discard(server)
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        server = self._checkout()
+        try:
+            yield server
+        except (smtplib.SMTPServerDisconnected, OSError):
+            server.close()
+            raise
+        except Exception:
+            self._checkin(server)
+            raise
+        else:
+            self._checkin(server)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._discard(server)
+
+smtp_pool = SMTPConnectionPool(SMTP_HOST, SMTP_PORT, SMTP_USE_SSL, GMAIL_SENDER, GMAIL_APP_PASSWORD, SMTP_POOL_SIZE)
+_send_slots: Optional[asyncio.Semaphore] = None
+
+def _get_send_slots() -> asyncio.Semaphore:
+    # Bounds the worker threads used for SMTP to the pool size so waiting senders don't hold threads.
+    global _send_slots
+    if _send_slots is None:
+        _send_slots = asyncio.Semaphore(SMTP_POOL_SIZE)
+    return _send_slots
+
+def _is_configured() -> bool:
+    if not GMAIL_SENDER or (not GMAIL_APP_PASSWORD and SMTP_HOST == "smtp.gmail.com"):
         logger.error("GMAIL_SENDER or GMAIL_APP_PASSWORD not set in .env")
         return False
+    return True
 
-    logger.info(f"Attempting to send email to {to_email} with subject '{subject}'")
+def _build_message(to_email: str, subject: str, body: str) -> MIMEMultipart:
     msg = MIMEMultipart()
     msg['From'] = GMAIL_SENDER
     msg['To'] = to_email
     msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
+    return msg
 
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(GMAIL_SENDER, GMAIL_APP_PASSWORD)
-            server.send_message(msg)
-        logger.info(f"Email sent successfully to {to_email}")
-        return True
-    except smtplib.SMTPAuthenticationError as e:
-        logger.error(f"Failed to send email to {to_email}: SMTP Authentication Error. Check your GMAIL_APP_PASSWORD. Error: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"Failed to send email to {to_email}: {e}")
-        return False
\ No newline at end of file
+def _send_batch_sync(messages: List[EmailMessage]) -> List[bool]:
+    """Sends every message over one pooled connection, reconnecting once if the server drops it."""
+    results: List[bool] = []
+    pending = list(messages)
+    reconnected = False
+    while pending:
+        try:
+            with smtp_pool.connection() as server:
+                while pending:
+                    to_email, subject, body = pending[0]
+                    try:
+                        server.send_message(_build_message(to_email, subject, body))
+                        logger.info(f"Email sent successfully to {to_email}")
+                        results.append(True)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                        logger.error(f"Failed to send email to {to_email}: {e}")
+                        results.append(False)
+                    pending.pop(0)
+        except smtplib.SMTPAuthenticationError as e:
+            logger.error(f"Failed to send email: SMTP Authentication Error. Check your GMAIL_APP_PASSWORD. Error: {e}")
+            break
+        except (smtplib.SMTPServerDisconnected, OSError) as e:
+            if reconnected:
+                logger.error(f"Failed to send email to {pending[0][0]}: {e}")
+                break
+            logger.warning(f"SMTP connection dropped ({e}); reconnecting.")
+            reconnected = True
+        except Exception as e:
+            logger.error(f"Failed to send email to {pending[0][0]}: {e}")
+            break
+    return results + [False] * len(pending)
+
+async def send_emails(messages: Iterable[EmailMessage]) -> List[bool]:
+    """Sends (to_email, subject, body) messages over a single pooled connection, off the event loop."""
+    messages = list(messages)
+    if not messages:
+        return []
+    if not _is_configured():
+        return [False] * len(messages)
+    logger.info(f"Sending {len(messages)} email(s) via {SMTP_HOST}:{SMTP_PORT}")
+    async with _get_send_slots():
+        with span("smtp.send", "client", messages=len(messages)) as current, EXTERNAL_CALL_SECONDS.time(service="smtp", operation="send") as labels:
+            results = await run_in_threadpool(_send_batch_sync, messages)
+            labels["outcome"] = "success" if all(results) else "error"
+            if current:
+                current.set(sent=sum(results))
+        return results
+
+async def send_email(to_email: str, subject: str, body: str) -> bool:
+    """Sends an email using Gmail SMTP. Requires a Gmail App Password."""
+    logger.info(f"Attempting to send email to {to_email} with subject '{subject}'")
+    results = await send_emails([(to_email, subject, body)])
+    return bool(results and results[0])
+
+def close_smtp_pool():
+    smtp_pool.close()
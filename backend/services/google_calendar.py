@@ -1,15 +1,23 @@
 import os
 import json
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional
 import pytz
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 import logging
 from starlette.concurrency import run_in_threadpool
 
+from backend.services.metrics import EXTERNAL_CALL_SECONDS
+from backend.services.tracing import span
+
+# The Google client libraries take a few hundred milliseconds to import, so they are
+# imported on first use; the /tools endpoints that never reach the calendar don't pay for them.
+if TYPE_CHECKING:
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_httplib2 import AuthorizedHttp
+
 load_dotenv()
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
@@ -17,7 +25,12 @@ SCOPES = ['https://www.googleapis.com/auth/calendar']
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_credentials():
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+HTTP_TIMEOUT_SECONDS = 30
+
+def _build_credentials() -> "Credentials":
+    from google.oauth2.credentials import Credentials
+
     client_id = os.getenv("GOOGLE_CLIENT_ID")
     client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
     refresh_token = os.getenv("GOOGLE_REFRESH_TOKEN")
@@ -29,7 +42,7 @@ def get_credentials():
 
     logger.info("Found Google credentials in environment variables. Creating credentials.")
     
-    creds = Credentials(
+    return Credentials(
         token=None,  
         refresh_token=refresh_token,
         token_uri="https://oauth2.googleapis.com/token",
@@ -38,42 +51,140 @@ def get_credentials():
         scopes=SCOPES,
     )
 
-    creds.refresh(Request())
-    
-    return creds
+class CalendarServiceManager:
+    """
+    Process-wide owner of the Google credentials and the Calendar client.
+    The access token is refreshed only when it is close to expiry, under a single
+    lock so concurrent callers don't all hit the token endpoint at once.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credentials: Optional["Credentials"] = None
+        self._service = None
+        self._token_request: Optional["Request"] = None
+        self._local = threading.local()
+
+    @staticmethod
+    def _needs_refresh(creds: "Credentials") -> bool:
+        if not creds.token or not creds.expiry:
+            return True
+        # google-auth keeps expiry as a naive UTC datetime.
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - TOKEN_REFRESH_MARGIN <= now
+
+    def get_credentials(self) -> "Credentials":
+        creds = self._credentials
+        if creds is not None and not self._needs_refresh(creds):
+            return creds
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = _build_credentials()
+            if self._needs_refresh(self._credentials):
+                if self._token_request is None:
+                    import requests
+                    from google.auth.transport.requests import Request
+                    self._token_request = Request(session=requests.Session())
+                self._credentials.refresh(self._token_request)
+                logger.info(f"Refreshed Google access token, valid until {self._credentials.expiry} UTC.")
+            return self._credentials
+
+    def get_service(self):
+        creds = self.get_credentials()
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    from googleapiclient.discovery import build
+                    self._service = build('calendar', 'v3', credentials=creds, cache_discovery=False)
+                    logger.info("Google Calendar service initialized successfully.")
+        return self._service
+
+    def _thread_http(self) -> "AuthorizedHttp":
+        # httplib2 connections are not thread-safe, so each worker thread keeps its own
+        # keep-alive transport bound to the shared credentials.
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            http = AuthorizedHttp(self.get_credentials(), http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+            self._local.http = http
+        return http
+
+    def execute(self, request):
+        self.get_credentials()
+        return request.execute(http=self._thread_http())
+
+    def reset(self):
+        with self._lock:
+            self._credentials = None
+            self._service = None
+            self._local = threading.local()
+
+calendar_manager = CalendarServiceManager()
+
+def get_credentials() -> "Credentials":
+    return calendar_manager.get_credentials()
 
-# The rest of the file remains the same.
 async def get_calendar_service():
     try:
-        creds = await run_in_threadpool(get_credentials)
-        service = build('calendar', 'v3', credentials=creds)
-        logger.info("Google Calendar service initialized successfully.")
-        return service
+        return await run_in_threadpool(calendar_manager.get_service)
     except Exception as e:
         logger.error(f"Failed to get Google Calendar service: {e}", exc_info=True)
         return None
 
-async def check_availability(doctor_email: str, start_time: datetime, end_time: datetime) -> bool:
+async def _execute(request, operation: str):
+    with span(f"google_calendar.{operation}", "client"), EXTERNAL_CALL_SECONDS.time(service="google_calendar", operation=operation):
+        return await run_in_threadpool(calendar_manager.execute, request)
+
+FREEBUSY_MAX_CALENDARS = 50
+
+def _parse_rfc3339(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def is_slot_free(busy_intervals: list[tuple[datetime, datetime]], start_time: datetime, end_time: datetime) -> bool:
+    """Returns True when [start_time, end_time) does not overlap any busy interval."""
+    return not any(busy_start < end_time and start_time < busy_end for busy_start, busy_end in busy_intervals)
+
+async def get_busy_intervals(calendar_ids: list[str], time_min: datetime, time_max: datetime) -> Optional[dict[str, list[tuple[datetime, datetime]]]]:
+    """
+    Fetches busy intervals for several calendars over a whole window in a single
+    freebusy query (one query per FREEBUSY_MAX_CALENDARS calendars, which is the API limit).
+    Returns None when the calendar could not be queried.
+    """
+    calendar_ids = list(dict.fromkeys(calendar_ids))
+    if not calendar_ids:
+        return {}
     service = await get_calendar_service()
-    if not service: return False
-    body = {"timeMin": start_time.isoformat(), "timeMax": end_time.isoformat(), "items": [{"id": doctor_email}]}
-    try:
-        response = service.freebusy().query(body=body).execute()
-        calendars = response.get('calendars', {})
-        if doctor_email in calendars:
-            busy_periods = calendars[doctor_email].get('busy', [])
-            return not busy_periods
-        return True
-    except HttpError as error:
-        logger.error(f"Error checking doctor availability for {doctor_email}: {error}")
-        return False
+    if not service: return None
+    from googleapiclient.errors import HttpError
+
+    busy_by_calendar: dict[str, list[tuple[datetime, datetime]]] = {calendar_id: [] for calendar_id in calendar_ids}
+    for offset in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+        chunk = calendar_ids[offset:offset + FREEBUSY_MAX_CALENDARS]
+        body = {"timeMin": time_min.isoformat(), "timeMax": time_max.isoformat(), "items": [{"id": calendar_id} for calendar_id in chunk]}
+        try:
+            response = await _execute(service.freebusy().query(body=body), "freebusy")
+        except HttpError as error:
+            logger.error(f"Error querying free/busy for {chunk}: {error}")
+            return None
+        for calendar_id, calendar in response.get('calendars', {}).items():
+            busy_by_calendar[calendar_id] = [
+                (_parse_rfc3339(period['start']), _parse_rfc3339(period['end']))
+                for period in calendar.get('busy', [])
+            ]
+    return busy_by_calendar
+
+async def check_availability(doctor_email: str, start_time: datetime, end_time: datetime) -> bool:
+    busy_by_calendar = await get_busy_intervals([doctor_email], start_time, end_time)
+    if busy_by_calendar is None: return False
+    return is_slot_free(busy_by_calendar.get(doctor_email, []), start_time, end_time)
 
 async def create_event(summary: str, description: str, start_time: datetime, end_time: datetime, attendees: list[str] = None, calendar_id: str = 'primary'):
     service = await get_calendar_service()
     if not service: return None
+    from googleapiclient.errors import HttpError
     event = {'summary': summary, 'description': description, 'start': {'dateTime': start_time.isoformat(), 'timeZone': 'UTC'}, 'end': {'dateTime': end_time.isoformat(), 'timeZone': 'UTC'}, 'attendees': [{'email': email} for email in attendees] if attendees else []}
     try:
-        event = service.events().insert(calendarId=calendar_id, body=event).execute()
+        event = await _execute(service.events().insert(calendarId=calendar_id, body=event), "insert_event")
         logger.info(f"Event created: {event.get('htmlLink')}")
         return event.get('htmlLink')
     except HttpError as error:
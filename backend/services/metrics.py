@@ -0,0 +1,204 @@
+# backend/services/metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds. Covers cache hits and single queries at the low end and LLM turns at the top.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in values]
+
+class Gauge(_Metric):
+    """A value read from `function` at scrape time, so nothing is recorded on the hot path."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name} {_format_number(self.function())}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (not cumulative; summed on render), then sum and count.
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[Dict[str, str]]:
+        """
+        Observes the block's duration. Yields the labels so the block can fill in ones only
+        known at the end (e.g. a status). If the block raises, `outcome` and any label not
+        filled in yet are set to "error"; otherwise `outcome` defaults to "success".
+        """
+        labels = dict(labels)
+        started = time.perf_counter()
+        try:
+            yield labels
+        except BaseException:
+            for name in self.labelnames:
+                if name == "outcome" or name not in labels:
+                    labels[name] = "error"
+            raise
+        finally:
+            if "outcome" in self.labelnames:
+                labels.setdefault("outcome", "success")
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._series.items())
+        lines = self.header()
+        bounds = [f'le="{_format_number(bound)}"' for bound in self.buckets] + ['le="+Inf"']
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    A small in-process Prometheus registry. Recording is a bisect and a few dict
+    operations under an uncontended lock; all formatting happens at scrape time.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, function: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, documentation, function))
+
+    def render(self) -> str:
+        """The Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+CHAT_TURN_SECONDS = registry.histogram(
+    "healthnexus_chat_turn_seconds", "Time to answer one chat prompt.", ("role", "path"))
+AGENT_ITERATIONS = registry.histogram(
+    "healthnexus_agent_iterations", "LLM calls the agent made for one chat prompt.", ("role",),
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10))
+LLM_CALL_SECONDS = registry.histogram(
+    "healthnexus_llm_call_seconds", "Duration of each chat model call.", ("model", "outcome"))
+LLM_TOKENS = registry.counter(
+    "healthnexus_llm_tokens_total", "Tokens reported by the chat model.", ("model", "kind"))
+TOOL_CALL_SECONDS = registry.histogram(
+    "healthnexus_tool_call_seconds", "Duration of each tool execution (cache hits excluded).", ("tool", "status"))
+DB_QUERY_SECONDS = registry.histogram(
+    "healthnexus_db_query_seconds", "Duration of each SQL statement.", ("operation",))
+EXTERNAL_CALL_SECONDS = registry.histogram(
+    "healthnexus_external_call_seconds", "Duration of calls to Google Calendar, SMTP and Slack.", ("service", "operation", "outcome"))
+
+def statement_operation(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+def _observe(context, statement: str):
+    started = getattr(context, "_query_started", None)
+    if started is not None:
+        context._query_started = None
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, operation=statement_operation(statement))
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _observe(context, statement)
+
+def _handle_error(exception_context):
+    # after_cursor_execute isn't called for a failed statement; it is timed here instead.
+    _observe(exception_context.execution_context, exception_context.statement or "")
+
+def instrument_engine(engine: Engine):
+    """Times every statement run on `engine`, failed ones included (for an AsyncEngine, pass its sync_engine)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+def result_status(result: object) -> str:
+    """The status label for a tool result: its "status" field, or success for non-dict results."""
+    return str(result.get("status", "success")) if isinstance(result, dict) else "success"
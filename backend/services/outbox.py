@@ -0,0 +1,181 @@
+# backend/services/outbox.py
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database import get_async_db_context
+from backend.models import OutboxEvent, utcnow
+from backend.services.email_service import send_email
+from backend.services.google_calendar import create_event
+from backend.services.tracing import start_trace
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "10"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 15 * 60
+# A row left in "processing" this long is assumed to belong to a crashed worker.
+PROCESSING_TIMEOUT = timedelta(minutes=5)
+
+def enqueue(db: AsyncSession, appointment_id: int, event_type: str, payload: dict) -> OutboxEvent:
+    """Adds a side effect to the caller's transaction; it is delivered only if that transaction commits."""
+    if event_type not in OUTBOX_HANDLERS:
+        raise ValueError(f"Unknown outbox event type '{event_type}'.")
+    event = OutboxEvent(
+        appointment_id=appointment_id,
+        event_type=event_type,
+        payload=payload,
+        status="pending",
+        attempts=0,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        next_attempt_at=utcnow(),
+    )
+    db.add(event)
+    return event
+
+async def _deliver_email(payload: dict) -> str:
+    if not await send_email(payload["to_email"], payload["subject"], payload["body"]):
+        raise RuntimeError("Email sending failed.")
+    return "Email sent successfully."
+
+async def _deliver_calendar_event(payload: dict) -> str:
+    link = await create_event(
+        summary=payload["summary"],
+        description=payload["description"],
+        start_time=datetime.fromisoformat(payload["start_time"]),
+        end_time=datetime.fromisoformat(payload["end_time"]),
+        attendees=payload.get("attendees"),
+    )
+    if not link:
+        raise RuntimeError("Failed to create calendar event.")
+    return link
+
+OUTBOX_HANDLERS: Dict[str, Callable[[dict], Awaitable[str]]] = {
+    "email": _deliver_email,
+    "calendar": _deliver_calendar_event,
+}
+
+def backoff_delay(attempts: int) -> timedelta:
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+async def _claim_batch(limit: int) -> List[Tuple[int, str, dict, int]]:
+    now = utcnow()
+    due = or_(
+        and_(OutboxEvent.status == "pending", OutboxEvent.next_attempt_at <= now),
+        and_(OutboxEvent.status == "processing", OutboxEvent.updated_at <= now - PROCESSING_TIMEOUT),
+    )
+    async with get_async_db_context() as db:
+        candidates = (
+            select(OutboxEvent.id).where(due)
+            .order_by(OutboxEvent.next_attempt_at).limit(limit).with_for_update(skip_locked=True)
+        )
+        # The claim re-checks `due` in the UPDATE itself: SQLite has no row locks, so two
+        # workers can pick the same candidates, and only the first update may win them.
+        claimed = (await db.execute(
+            update(OutboxEvent).where(OutboxEvent.id.in_(candidates), due)
+            .values(status="processing", attempts=func.coalesce(OutboxEvent.attempts, 0) + 1, updated_at=now)
+            .returning(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload, OutboxEvent.attempts)
+            .execution_options(synchronize_session=False)
+        )).all()
+        return sorted((tuple(row) for row in claimed), key=lambda row: row[0])
+
+async def _record_outcome(event_id: int, attempts: int, result: Optional[str], error: Optional[str]):
+    async with get_async_db_context() as db:
+        event = await db.get(OutboxEvent, event_id)
+        if event is None:
+            return
+        if error is None:
+            event.status = "done"
+            event.result = result
+            event.last_error = None
+        elif attempts >= (event.max_attempts or OUTBOX_MAX_ATTEMPTS):
+            event.status = "failed"
+            event.last_error = error
+        else:
+            event.status = "pending"
+            event.last_error = error
+            event.next_attempt_at = utcnow() + backoff_delay(attempts)
+
+async def process_event(event_id: int, event_type: str, payload: dict, attempts: int):
+    result, error = None, None
+    with start_trace(f"outbox.{event_type}", kind="internal", event_id=event_id, attempt=attempts) as current:
+        try:
+            result = await OUTBOX_HANDLERS[event_type](payload)
+            logger.info(f"Outbox event {event_id} ({event_type}) delivered.")
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            logger.warning(f"Outbox event {event_id} ({event_type}) attempt {attempts} failed: {error}")
+            if current:
+                current.set(error=error)
+        await _record_outcome(event_id, attempts, result, error)
+
+async def drain_once(limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Claims and processes one batch of due events. Returns how many were claimed."""
+    batch = await _claim_batch(limit)
+    for event_id, event_type, payload, attempts in batch:
+        await process_event(event_id, event_type, payload, attempts)
+    return len(batch)
+
+class OutboxWorkerPool:
+    """Background tasks that drain the outbox, woken early by notify() after a booking commits."""
+    def __init__(self, num_workers: int = OUTBOX_WORKERS, poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.num_workers = num_workers
+        self.poll_seconds = poll_seconds
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        if self._tasks or self.num_workers <= 0:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(i), name=f"outbox-worker-{i}") for i in range(self.num_workers)]
+        logger.info(f"Started {self.num_workers} outbox workers.")
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self):
+        self._stopping = True
+        self.notify()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Outbox workers stopped.")
+
+    async def _run(self, worker_id: int):
+        while not self._stopping:
+            try:
+                claimed = await drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker {worker_id} error: {e}", exc_info=True)
+                claimed = 0
+            if claimed:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+outbox_workers = OutboxWorkerPool()
@@ -1,19 +1,29 @@
 # backend/services/seeder.py
 
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from faker import Faker
 from datetime import datetime, timedelta, date
+from itertools import islice
 import logging
+import os
 import pytz
 
 from backend.database import init_db
 from backend.models import Doctor, Patient, DoctorAvailability, Appointment
+from backend.services.doctor_directory import doctor_directory
+from backend.services.slot_index import slot_index
+from backend.services.tool_cache import AVAILABILITY_TOOLS, tool_cache
 
 fake = Faker()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 IST = pytz.timezone('Asia/Kolkata')
+SLOT_HOURS = [9, 11, 14, 16]
+SEED_AVAILABILITY_DAYS = int(os.getenv("SEED_AVAILABILITY_DAYS", "7"))
+SEED_BATCH_SIZE = 5000
 
 def seed_doctors(db: Session):
     predefined_doctor_email = "e.reed.neuro@clinic.com"
@@ -29,49 +39,92 @@ def seed_doctors(db: Session):
         db.add(predefined_doctor)
         logger.info("Created predefined Neurologist: Dr. Evelyn Reed.")
         db.commit()
+        doctor_directory.invalidate()
+        tool_cache.invalidate()
 
-def seed_availabilities(db: Session, num_days: int = 7):
+def _insert_ignoring_existing(db: Session):
+    """INSERT ... ON CONFLICT DO NOTHING, so a concurrent refresh can't fail on slots it also created."""
+    insert_for_dialect = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    return insert_for_dialect(DoctorAvailability.__table__).on_conflict_do_nothing(
+        index_elements=["doctor_id", "start_time"]
+    )
+
+def seed_availabilities(db: Session, num_days: int = SEED_AVAILABILITY_DAYS) -> dict:
+    """
+    Rolls the availability schedule forward: deletes slots from past days and adds slots
+    for every day in the next `num_days` after each doctor's last scheduled day. Existing
+    future slots, booked or not, are left untouched, so the schedule is never empty while
+    this runs and it is cheap enough to run nightly.
+    """
     logger.info("Refreshing doctor availability schedule...")
-    
-    all_doctors = db.query(Doctor).all()
-    if not all_doctors:
+    today = date.today()
+    horizon = today + timedelta(days=num_days)
+
+    deleted = db.execute(
+        delete(DoctorAvailability).where(DoctorAvailability.date < today)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # One row per doctor, read from the (doctor_id, date, is_booked) index.
+    last_day_by_doctor = dict(db.execute(
+        select(Doctor.id, func.max(DoctorAvailability.date))
+        .outerjoin(DoctorAvailability, and_(DoctorAvailability.doctor_id == Doctor.id, DoctorAvailability.date >= today))
+        .group_by(Doctor.id)
+    ).all())
+    if not last_day_by_doctor:
         logger.warning("No doctors found in the database to seed availabilities for.")
-        return
+        db.commit()
+        return {"deleted": deleted, "inserted": 0}
 
-    future_appointments = db.query(Appointment).filter(
-        Appointment.appointment_time >= datetime.now(pytz.utc)
-    ).all()
-    
-    booked_slots = set()
-    for appt in future_appointments:
-        ist_time = appt.appointment_time.astimezone(IST)
-        naive_ist_time = ist_time.replace(tzinfo=None)
-        booked_slots.add((appt.doctor_id, naive_ist_time))
-    
-    db.query(DoctorAvailability).delete()
-        
-    new_availability_slots = []
-    for doctor in all_doctors:
-        for i in range(num_days):
-            current_date = date.today() + timedelta(days=i)
-            for hour in [9, 11, 14, 16]: 
-                aware_datetime = IST.localize(datetime(current_date.year, current_date.month, current_date.day, hour, 0, 0))
-                naive_datetime = aware_datetime.replace(tzinfo=None)
-                
-                is_slot_booked = (doctor.id, naive_datetime) in booked_slots
-                
-                new_slot = DoctorAvailability(
-                    doctor_id=doctor.id,
-                    date=current_date,
-                    start_time=naive_datetime,  
-                    end_time=naive_datetime + timedelta(hours=1),
-                    is_booked=is_slot_booked
-                )
-                new_availability_slots.append(new_slot)
+    first_day_by_doctor = {
+        doctor_id: max(last_day + timedelta(days=1), today) if last_day else today
+        for doctor_id, last_day in last_day_by_doctor.items()
+    }
+    first_new_day = min(first_day_by_doctor.values())
+    if first_new_day >= horizon:
+        db.commit()
+        logger.info(f"Availability is already scheduled through {horizon - timedelta(days=1)}; removed {deleted} past slots.")
+        return {"deleted": deleted, "inserted": 0}
+
+    # Only appointments on the days being added can affect the new slots.
+    booked_slots = set(db.execute(
+        select(Appointment.doctor_id, Appointment.appointment_time).where(
+            Appointment.appointment_time >= datetime.combine(first_new_day, datetime.min.time()),
+            Appointment.status != "cancelled"
+        )
+    ).all())
+
+    def new_slot_rows():
+        for doctor_id, first_day in first_day_by_doctor.items():
+            current_date = first_day
+            while current_date < horizon:
+                for hour in SLOT_HOURS:
+                    # start_time is naive IST wall-clock time, like appointment_time.
+                    start_time = datetime(current_date.year, current_date.month, current_date.day, hour)
+                    yield {
+                        "doctor_id": doctor_id,
+                        "date": current_date,
+                        "start_time": start_time,
+                        "end_time": start_time + timedelta(hours=1),
+                        "is_booked": (doctor_id, start_time) in booked_slots,
+                    }
+                current_date += timedelta(days=1)
 
-    db.add_all(new_availability_slots)
+    # Slots a concurrent refresh already created return no row, so they aren't counted. (rowcount
+    # can't be used: on PostgreSQL a batched insert reports only its last page of rows.)
+    statement = _insert_ignoring_existing(db).returning(DoctorAvailability.id)
+    inserted = 0
+    rows = new_slot_rows()
+    while batch := list(islice(rows, SEED_BATCH_SIZE)):
+        inserted += len(db.execute(statement, batch).all())
     db.commit()
-    logger.info(f"Refreshed availability for {len(all_doctors)} doctors, preserving {len(booked_slots)} existing bookings.")
+    slot_index.invalidate()
+    tool_cache.invalidate(AVAILABILITY_TOOLS)
+    logger.info(
+        f"Refreshed availability for {len(last_day_by_doctor)} doctors through {horizon - timedelta(days=1)}: "
+        f"added {inserted} slots, removed {deleted} past slots."
+    )
+    return {"deleted": deleted, "inserted": inserted}
 
 def seed_all(db: Session):
     logger.info("Running smart seeder...")
@@ -0,0 +1,161 @@
+# backend/services/session_store.py
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _SessionEntry:
+    value: Any
+    last_access: float
+    size: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+class ChatSessionStore:
+    """
+    In-process store for chat sessions with LRU + idle-TTL eviction.
+
+    Sessions are kept in last-access order, so both the least recently used and the
+    longest idle sessions sit at the front of the OrderedDict. Each session has its own
+    lock, so two requests for the same session run one after the other instead of
+    interleaving their turns in the same conversation memory.
+    """
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_ttl_seconds: float = 1800,
+        max_memory_bytes: Optional[int] = None,
+        size_of: Optional[Callable[[Any], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self._size_of = size_of or (lambda value: 0)
+        self._clock = clock
+        self._entries: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def _remove(self, session_id: str) -> _SessionEntry:
+        entry = self._entries.pop(session_id)
+        self._memory_bytes -= entry.size
+        return entry
+
+    def _expire_idle(self, now: float):
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_access < self.idle_ttl_seconds:
+                break
+            self._remove(session_id)
+            self.expirations += 1
+            logger.info(f"Expired idle chat session {session_id}.")
+
+    def _over_capacity(self) -> bool:
+        if len(self._entries) > self.max_sessions:
+            return True
+        return self.max_memory_bytes is not None and self._memory_bytes > self.max_memory_bytes
+
+    def _evict_over_capacity(self, keep: Optional[str] = None):
+        # Idle sessions go first, so they never push out one that is still in use.
+        self._expire_idle(self._clock())
+        for session_id in list(self._entries):
+            if not self._over_capacity():
+                break
+            if session_id == keep:
+                continue
+            self._remove(session_id)
+            self.evictions += 1
+            logger.info(f"Evicted chat session {session_id} (store at capacity).")
+
+    def _resize(self, session_id: str, entry: _SessionEntry):
+        if self._entries.get(session_id) is not entry:
+            return
+        try:
+            size = self._size_of(entry.value)
+        except Exception as e:
+            logger.warning(f"Could not size chat session {session_id}: {e}")
+            return
+        self._memory_bytes += size - entry.size
+        entry.size = size
+        self._evict_over_capacity(keep=session_id)
+
+    @asynccontextmanager
+    async def checkout(
+        self,
+        session_id: Optional[str],
+        factory: Callable[[], Any],
+        is_valid: Optional[Callable[[Any], bool]] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yields (session_id, value) with the session's lock held. Unknown or expired
+        session ids get a fresh id and a value from `factory`; a value rejected by
+        `is_valid` is rebuilt in place.
+        """
+        async with self._lock:
+            self._expire_idle(self._clock())
+            entry = self._entries.get(session_id) if session_id else None
+            if entry is not None:
+                self.hits += 1
+                entry.last_access = self._clock()
+                self._entries.move_to_end(session_id)
+                self._evict_over_capacity(keep=session_id)
+
+        if entry is None:
+            # Built outside the store lock, so a slow factory doesn't hold up other sessions.
+            value = factory()
+            async with self._lock:
+                self.misses += 1
+                # A fresh id, so no other request can have created this session meanwhile.
+                session_id = str(uuid.uuid4())
+                logger.info(f"Creating new chat session {session_id}.")
+                entry = self._entries[session_id] = _SessionEntry(value=value, last_access=self._clock())
+                self._evict_over_capacity(keep=session_id)
+
+        async with entry.lock:
+            if is_valid is not None and not is_valid(entry.value):
+                logger.info(f"Rebuilding chat session {session_id}.")
+                entry.value = factory()
+            try:
+                yield session_id, entry.value
+            finally:
+                entry.last_access = self._clock()
+                self._resize(session_id, entry)
+
+    def discard(self, session_id: str) -> bool:
+        if session_id not in self._entries:
+            return False
+        self._remove(session_id)
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -1,30 +1,168 @@
 # backend/services/slack_notifier.py
-import requests
+import asyncio
+import contextvars
+import math
 import os
+from typing import TYPE_CHECKING, List, Optional
 from dotenv import load_dotenv
 import logging
 
+from backend.services.metrics import EXTERNAL_CALL_SECONDS
+from backend.services.tracing import span, start_trace
+
+# httpx (and the rich console it pulls in) is imported with the first post, not at startup.
+if TYPE_CHECKING:
+    import httpx
+
 load_dotenv()
 
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")
+# Messages queued within this window are posted together.
+SLACK_COALESCE_SECONDS = float(os.getenv("SLACK_COALESCE_SECONDS", "2"))
+# Slack truncates long messages; keep each post comfortably below the limit.
+SLACK_MAX_MESSAGE_CHARS = 3900
+SLACK_MAX_RETRIES = 3
+SLACK_TIMEOUT_SECONDS = 10.0
+SLACK_CONNECT_TIMEOUT_SECONDS = 5.0
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def send_slack_message(message: str) -> bool:
-    """
-    Sends a message to Slack using a webhook URL.
-    """
-    if not SLACK_WEBHOOK_URL:
-        logger.error("SLACK_WEBHOOK_URL not set in .env")
-        return False
+def coalesce_messages(messages: List[str], max_chars: int = SLACK_MAX_MESSAGE_CHARS) -> List[str]:
+    """Packs messages into as few posts as possible, splitting any single message that is too long."""
+    pieces: List[str] = []
+    for message in messages:
+        while len(message) > max_chars:
+            cut = message.rfind("\n", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(message[:cut])
+            message = message[cut:].lstrip("\n")
+        if message:
+            pieces.append(message)
 
-    payload = {"text": message}
+    posts: List[str] = []
+    for piece in pieces:
+        if posts and len(posts[-1]) + 2 + len(piece) <= max_chars:
+            posts[-1] = f"{posts[-1]}\n\n{piece}"
+        else:
+            posts.append(piece)
+    return posts
+
+def _retry_after(response: "httpx.Response", default: float) -> float:
+    """The Retry-After delay in seconds, or `default` when the header is missing or not a number."""
     try:
-        response = requests.post(SLACK_WEBHOOK_URL, json=payload)
-        response.raise_for_status()
-        logger.info("Slack message sent successfully.")
+        delay = float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return default
+    return delay if math.isfinite(delay) and delay >= 0 else default
+
+class SlackNotifier:
+    """Queues Slack messages and posts them in coalesced batches over a pooled HTTP client."""
+    def __init__(self, webhook_url: Optional[str], window_seconds: float = SLACK_COALESCE_SECONDS):
+        self.webhook_url = webhook_url
+        self.window_seconds = window_seconds
+        self._pending: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(SLACK_TIMEOUT_SECONDS, connect=SLACK_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=2),
+            )
+        return self._client
+
+    async def notify(self, message: str) -> bool:
+        """Queues a message for the next post. Returns False only when Slack is not configured."""
+        if not self.webhook_url:
+            logger.error("SLACK_WEBHOOK_URL not set in .env")
+            return False
+        self._pending.append(message)
+        if self._flush_task is None:
+            # Started in an empty context: the flush posts for every request that queued a
+            # message, so it must not become part of this request's trace.
+            self._flush_task = contextvars.Context().run(asyncio.create_task, self._flush_after_window())
         return True
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send Slack message: {e}")
-        return False
\ No newline at end of file
+
+    async def _flush_after_window(self):
+        try:
+            while self._pending:
+                await asyncio.sleep(self.window_seconds)
+                await self.flush()
+        except Exception as e:
+            logger.error(f"Slack flush failed: {e}", exc_info=True)
+        finally:
+            self._flush_task = None
+
+    async def flush(self) -> bool:
+        messages, self._pending = self._pending, []
+        if not messages:
+            return True
+        posts = coalesce_messages(messages)
+        results: List[bool] = []
+        try:
+            with start_trace("slack.flush", kind="internal", messages=len(messages), posts=len(posts)):
+                for text in posts:
+                    results.append(await self._post(text))
+        finally:
+            if len(results) < len(posts):
+                # Interrupted (e.g. cancelled by aclose): the unsent posts go out with the next flush.
+                self._pending[:0] = posts[len(results):]
+        logger.info(f"Posted {len(messages)} Slack message(s) in {len(posts)} request(s).")
+        return all(results)
+
+    async def _post(self, text: str) -> bool:
+        import httpx
+        client = self._get_client()
+        for attempt in range(SLACK_MAX_RETRIES + 1):
+            try:
+                with span("slack.post", "client", attempt=attempt + 1) as current, EXTERNAL_CALL_SECONDS.time(service="slack", operation="post") as labels:
+                    response = await client.post(self.webhook_url, json={"text": text})
+                    labels["outcome"] = "success" if response.status_code < 400 else "error"
+                    if current:
+                        current.set(status_code=response.status_code)
+            except httpx.HTTPError as e:
+                logger.warning(f"Slack request failed (attempt {attempt + 1}): {e}")
+                if attempt < SLACK_MAX_RETRIES:
+                    await asyncio.sleep(2 ** attempt)
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                delay = _retry_after(response, default=2 ** attempt)
+                logger.warning(f"Slack returned {response.status_code}; retrying in {delay:.1f}s.")
+                if attempt < SLACK_MAX_RETRIES:
+                    await asyncio.sleep(delay)
+                continue
+
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                logger.error(f"Failed to send Slack message: {e}")
+                return False
+            logger.info("Slack message sent successfully.")
+            return True
+
+        logger.error(f"Failed to send Slack message after {SLACK_MAX_RETRIES + 1} attempts.")
+        return False
+
+    async def aclose(self):
+        """Posts anything still queued and closes the HTTP client."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+slack_notifier = SlackNotifier(SLACK_WEBHOOK_URL)
+
+async def send_slack_message(message: str) -> bool:
+    """
+    Queues a message for Slack. Bursts are coalesced and posted in the background,
+    so callers don't wait on the webhook round trip.
+    """
+    return await slack_notifier.notify(message)
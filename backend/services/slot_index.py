@@ -0,0 +1,162 @@
+# backend/services/slot_index.py
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import DoctorAvailability
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SLOT_INDEX_TTL_SECONDS = float(os.getenv("SLOT_INDEX_TTL_SECONDS", "30"))
+SLOT_INDEX_DAYS = int(os.getenv("SLOT_INDEX_DAYS", "30"))
+
+# A day's slots as (start, end) offsets from midnight, interned so that every doctor and
+# day with the same hours shares one tuple.
+Layout = Tuple[Tuple[timedelta, timedelta], ...]
+
+@dataclass
+class _DoctorSlots:
+    """One doctor's schedule: per day, a shared layout and a bitmask with bit i set while slot i is open."""
+    first_day: date
+    last_day: date
+    loaded_at: float
+    generation: int
+    days: Dict[date, Tuple[Layout, int]] = field(default_factory=dict)
+
+def _offset(value: datetime) -> timedelta:
+    return value - datetime.combine(value.date(), datetime.min.time())
+
+class SlotIndex:
+    """
+    Process-local index of open availability slots for the next SLOT_INDEX_DAYS days.
+    A doctor's days are loaded with one query on first use and reloaded once the TTL
+    passes, so bookings made by other processes show up within SLOT_INDEX_TTL_SECONDS.
+    Bookings and cancellations in this process update the bits directly.
+    """
+    def __init__(self, ttl_seconds: float = SLOT_INDEX_TTL_SECONDS, window_days: int = SLOT_INDEX_DAYS):
+        self.ttl_seconds = ttl_seconds
+        self.window_days = window_days
+        self._doctors: Dict[int, _DoctorSlots] = {}
+        self._layouts: Dict[Layout, Layout] = {}
+        self._generation = 0
+        # One in-flight load per doctor; concurrent requests for the same doctor wait on it.
+        self._loading: Dict[int, asyncio.Future] = {}
+        # Changes seen while a doctor is being loaded, replayed onto the fresh copy.
+        self._pending: Dict[int, List[Tuple[datetime, bool]]] = {}
+        self.loads = 0
+
+    def invalidate(self, doctor_id: Optional[int] = None):
+        """Drops one doctor, or (without an id) everything, e.g. after the seeder changed the schedule."""
+        if doctor_id is None:
+            self._generation += 1
+        else:
+            self._doctors.pop(doctor_id, None)
+
+    def _fresh(self, doctor_id: int) -> Optional[_DoctorSlots]:
+        slots = self._doctors.get(doctor_id)
+        if (slots is None or slots.generation != self._generation
+                or time.monotonic() - slots.loaded_at > self.ttl_seconds or slots.first_day != date.today()):
+            return None
+        return slots
+
+    async def ensure_loaded(self, db: AsyncSession, doctor_id: int):
+        while not self._fresh(doctor_id):
+            loading = self._loading.get(doctor_id)
+            if loading is None:
+                await self._load(db, doctor_id)
+                return
+            # Another request is loading this doctor: wait for it (nothing is locked meanwhile,
+            # so other doctors are unaffected), then check again in case that load failed.
+            await asyncio.wait([loading])
+
+    async def _load(self, db: AsyncSession, doctor_id: int):
+        loading = self._loading[doctor_id] = asyncio.get_running_loop().create_future()
+        self._pending[doctor_id] = []
+        generation = self._generation
+        first_day = date.today()
+        last_day = first_day + timedelta(days=self.window_days - 1)
+        try:
+            rows = (await db.execute(
+                select(DoctorAvailability.date, DoctorAvailability.start_time, DoctorAvailability.end_time, DoctorAvailability.is_booked)
+                .where(
+                    DoctorAvailability.doctor_id == doctor_id,
+                    DoctorAvailability.date >= first_day,
+                    DoctorAvailability.date <= last_day,
+                ).order_by(DoctorAvailability.date, DoctorAvailability.start_time)
+            )).all()
+            by_day: Dict[date, List[Tuple[Tuple[timedelta, timedelta], bool]]] = {}
+            for day, start_time, end_time, is_booked in rows:
+                start = _offset(start_time)
+                by_day.setdefault(day, []).append(((start, start + (end_time - start_time)), not is_booked))
+
+            slots = _DoctorSlots(first_day, last_day, time.monotonic(), generation)
+            for day, day_slots in by_day.items():
+                layout = tuple(slot for slot, _ in day_slots)
+                layout = self._layouts.setdefault(layout, layout)
+                open_mask = sum(1 << i for i, (_, is_open) in enumerate(day_slots) if is_open)
+                slots.days[day] = (layout, open_mask)
+            self._doctors[doctor_id] = slots
+            for start_time, is_open in self._pending[doctor_id]:
+                self.mark(doctor_id, start_time, is_open)
+            self.loads += 1
+        finally:
+            self._pending.pop(doctor_id, None)
+            del self._loading[doctor_id]
+            loading.set_result(None)
+
+    def covers(self, doctor_id: int, day: date) -> bool:
+        slots = self._fresh(doctor_id)
+        return bool(slots) and slots.first_day <= day <= slots.last_day
+
+    def open_slots(self, doctor_id: int, day: date) -> Optional[List[Tuple[datetime, datetime]]]:
+        """Open (start, end) times for the day, or None if the index can't answer (not loaded, stale or out of range)."""
+        if not self.covers(doctor_id, day):
+            return None
+        layout, open_mask = self._doctors[doctor_id].days.get(day, ((), 0))
+        midnight = datetime.combine(day, datetime.min.time())
+        return [(midnight + start, midnight + end) for i, (start, end) in enumerate(layout) if open_mask >> i & 1]
+
+    def is_open(self, doctor_id: int, start_time: datetime) -> Optional[bool]:
+        """Whether a slot starting at start_time is open; None if the index can't answer."""
+        day = start_time.date()
+        if not self.covers(doctor_id, day):
+            return None
+        layout, open_mask = self._doctors[doctor_id].days.get(day, ((), 0))
+        offset = _offset(start_time)
+        for i, (start, _) in enumerate(layout):
+            if start == offset:
+                return bool(open_mask >> i & 1)
+        return False
+
+    def mark(self, doctor_id: int, start_time: datetime, is_open: bool):
+        """Records a booking (is_open=False) or cancellation (is_open=True) made by this process."""
+        if doctor_id in self._pending:
+            self._pending[doctor_id].append((start_time, is_open))
+        slots = self._doctors.get(doctor_id)
+        if slots is None or start_time.date() not in slots.days:
+            return
+        layout, open_mask = slots.days[start_time.date()]
+        offset = _offset(start_time)
+        for i, (start, _) in enumerate(layout):
+            if start == offset:
+                open_mask = open_mask | (1 << i) if is_open else open_mask & ~(1 << i)
+                slots.days[start_time.date()] = (layout, open_mask)
+                return
+
+    def stats(self) -> dict:
+        return {
+            "doctors": len(self._doctors),
+            "days": sum(len(slots.days) for slots in self._doctors.values()),
+            "layouts": len(self._layouts),
+            "loads": self.loads,
+        }
+
+slot_index = SlotIndex()
@@ -0,0 +1,136 @@
+# backend/services/tool_cache.py
+import asyncio
+import copy
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from cachetools import TTLCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl_seconds: float
+    max_entries: int
+
+# Read-only tools whose results are worth reusing. Availability also depends on Google
+# Calendar, which nothing here is told about, hence the short TTL there.
+TOOL_CACHE_POLICIES: Dict[str, CachePolicy] = {
+    "get_doctors_by_specialty": CachePolicy(ttl_seconds=300, max_entries=256),
+    "get_doctor_details_by_name": CachePolicy(ttl_seconds=300, max_entries=1024),
+    "check_doctor_availability": CachePolicy(ttl_seconds=30, max_entries=2048),
+    "find_next_available_slot": CachePolicy(ttl_seconds=30, max_entries=2048),
+}
+AVAILABILITY_TOOLS = ("check_doctor_availability", "find_next_available_slot")
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+@dataclass
+class _ToolStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    invalidations: int = 0
+
+class ToolResultCache:
+    """
+    Read-through cache for tool results, one size-bounded TTL cache per tool.
+
+    Only successful results are stored. Concurrent identical calls share one execution.
+    Each tool has a generation counter, bumped on invalidation, so a call that started
+    before a write can't store its now-stale result afterwards. Entries can be tagged
+    with a doctor's email, so a booking only drops that doctor's cached availability
+    (plus untagged entries, which might mention anyone).
+    """
+    def __init__(self, policies: Dict[str, CachePolicy] = TOOL_CACHE_POLICIES):
+        self.policies = policies
+        self._caches = {name: TTLCache(maxsize=policy.max_entries, ttl=policy.ttl_seconds) for name, policy in policies.items()}
+        self._generations = {name: 0 for name in policies}
+        self._stats = {name: _ToolStats() for name in policies}
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        # The seeder invalidates from a worker thread; cachetools caches aren't thread-safe.
+        self._lock = threading.Lock()
+
+    def is_cached(self, tool_name: str) -> bool:
+        return tool_name in self._caches
+
+    async def get_or_call(self, tool_name: str, arguments: dict, call: Callable[[], Awaitable[Any]]) -> Any:
+        if tool_name not in self._caches:
+            return await call()
+        key = _freeze(arguments)
+        stats = self._stats[tool_name]
+        with self._lock:
+            entry = self._caches[tool_name].get(key)
+        if entry is not None:
+            stats.hits += 1
+            return copy.deepcopy(entry[0])
+
+        inflight = self._inflight.get((tool_name, key))
+        if inflight is not None:
+            stats.coalesced += 1
+            return copy.deepcopy(await asyncio.shield(inflight))
+
+        stats.misses += 1
+        generation = self._generations[tool_name]
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(tool_name, key)] = future
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so it isn't logged as unhandled.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if isinstance(result, dict) and result.get("status") == "success":
+                with self._lock:
+                    if self._generations[tool_name] == generation:
+                        self._caches[tool_name][key] = (copy.deepcopy(result), (result.get("doctor_email") or "").lower())
+            return result
+        finally:
+            del self._inflight[(tool_name, key)]
+
+    def invalidate(self, tool_names: Optional[Iterable[str]] = None, doctor_email: Optional[str] = None):
+        """Drops cached results of the given tools (default: all), or only those tagged with `doctor_email` or untagged."""
+        names = [name for name in (tool_names or self._caches) if name in self._caches]
+        doctor_email = doctor_email.lower() if doctor_email else None
+        with self._lock:
+            for name in names:
+                self._generations[name] += 1
+                self._stats[name].invalidations += 1
+                cache = self._caches[name]
+                if doctor_email is None:
+                    cache.clear()
+                    continue
+                for key in [key for key, (_, tag) in cache.items() if tag in ("", doctor_email)]:
+                    cache.pop(key, None)
+
+    def stats(self) -> dict:
+        tools = {}
+        for name, stats in self._stats.items():
+            lookups = stats.hits + stats.misses + stats.coalesced
+            tools[name] = {
+                "hits": stats.hits,
+                "misses": stats.misses,
+                "coalesced": stats.coalesced,
+                "hit_rate": round((stats.hits + stats.coalesced) / lookups, 4) if lookups else 0.0,
+                "invalidations": stats.invalidations,
+                "entries": len(self._caches[name]),
+                "ttl_seconds": self.policies[name].ttl_seconds,
+            }
+        hits = sum(stats.hits + stats.coalesced for stats in self._stats.values())
+        lookups = hits + sum(stats.misses for stats in self._stats.values())
+        return {"hit_rate": round(hits / lookups, 4) if lookups else 0.0, "tools": tools}
+
+tool_cache = ToolResultCache()
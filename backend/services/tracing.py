@@ -0,0 +1,317 @@
+# backend/services/tracing.py
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.services.metrics import statement_operation
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "jsonl" appends finished spans to TRACING_FILE, "otlp" posts them to an OTLP/HTTP
+# collector; unset records nothing unless a request asks for its trace (debug).
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").strip().lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+OTLP_TRACES_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") or (
+    os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/") + "/v1/traces"
+)
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "healthnexus")
+# Long tool arguments and SQL statements are cut to this many characters.
+MAX_ATTRIBUTE_CHARS = 300
+MAX_SUMMARY_SPANS = 10
+
+def _clip(text: str) -> str:
+    return text if len(text) <= MAX_ATTRIBUTE_CHARS else text[:MAX_ATTRIBUTE_CHARS] + "..."
+
+def _attribute(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return _clip(value)
+    return _clip(json.dumps(value, default=str))
+
+@dataclass
+class Span:
+    name: str
+    trace: "Trace"
+    parent_id: Optional[str]
+    kind: str = "internal"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        for name, value in attributes.items():
+            self.attributes[name] = _attribute(value)
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{error.__class__.__name__}: {error}"
+        self.trace.finished(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": {**self.trace.attributes, **self.attributes},
+        }
+
+class Trace:
+    """The spans of one request. They are exported together when the root span ends."""
+    def __init__(self, export: bool):
+        self.trace_id = secrets.token_hex(16)
+        self.export = export
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        # Stamped on every exported span, e.g. the session_id.
+        self.attributes: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def set(self, **attributes: Any):
+        for name, value in attributes.items():
+            self.attributes[name] = _attribute(value)
+
+    def finished(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            done = span is self.root
+            late = self.root is not None and self.root.end_ns is not None and not done
+        if self.export and (done or late):
+            # Spans ending after the root (e.g. a cancelled task) are exported on their own.
+            exporter.submit(list(self.spans) if done else [span])
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Where the request spent its time: totals per span name, the slowest spans, and the
+        critical path (from the root, repeatedly the child that finished last).
+        """
+        with self._lock:
+            spans = list(self.spans)
+        by_name: Dict[str, Dict[str, Any]] = {}
+        children: Dict[Optional[str], List[Span]] = {}
+        for recorded in spans:
+            totals = by_name.setdefault(recorded.name, {"count": 0, "total_ms": 0.0})
+            totals["count"] += 1
+            totals["total_ms"] = round(totals["total_ms"] + recorded.duration_ms, 3)
+            children.setdefault(recorded.parent_id, []).append(recorded)
+        critical_path = []
+        node = self.root
+        while node is not None:
+            critical_path.append({"name": node.name, "duration_ms": round(node.duration_ms, 3)})
+            below = children.get(node.span_id)
+            node = max(below, key=lambda child: child.end_ns or 0) if below else None
+        slowest = sorted((recorded for recorded in spans if recorded is not self.root), key=lambda recorded: recorded.duration_ms, reverse=True)
+        return {
+            "trace_id": self.trace_id,
+            "duration_ms": round(self.root.duration_ms, 3) if self.root else 0.0,
+            "span_count": len(spans),
+            "by_name": dict(sorted(by_name.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            "critical_path": critical_path,
+            "slowest": [
+                {"name": recorded.name, "duration_ms": round(recorded.duration_ms, 3), "attributes": recorded.attributes}
+                for recorded in slowest[:MAX_SUMMARY_SPANS]
+            ],
+        }
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_trace() -> Optional[Trace]:
+    span = _current_span.get()
+    return span.trace if span else None
+
+def start_span(name: str, kind: str = "internal", **attributes: Any) -> Optional[Span]:
+    """
+    Starts a child of the current span without making it current; the caller ends it.
+    Returns None (and costs one ContextVar lookup) when no trace is being recorded.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    span = Span(name, parent.trace, parent.span_id, kind)
+    span.set(**attributes)
+    return span
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.end(e)
+        raise
+    finally:
+        span.end()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # An async generator closed from another context (e.g. a dropped stream).
+            pass
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes: Any) -> Iterator[Optional[Span]]:
+    """Records the block as a child of the current span; a no-op outside a trace."""
+    child = start_span(name, kind, **attributes)
+    if child is None:
+        yield None
+        return
+    with _activate(child):
+        yield child
+
+@contextmanager
+def start_trace(name: str, record: bool = False, kind: str = "server", **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Starts a trace with the block as its root span and yields that span, or None when
+    tracing is off. `record` traces the block anyway (for its summary) without exporting it.
+    Inside an existing trace, this is just a child span.
+    """
+    if _current_span.get() is not None:
+        with span(name, kind, **attributes) as child:
+            yield child
+        return
+    if not (TRACING_EXPORTER or record):
+        yield None
+        return
+    trace = Trace(export=bool(TRACING_EXPORTER))
+    root = trace.root = Span(name, trace, None, kind)
+    root.set(**attributes)
+    with _activate(root):
+        yield root
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._trace_span = start_span(f"db.{statement_operation(statement).lower()}", "client", statement=statement)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    pending = getattr(context, "_trace_span", None)
+    if pending is not None:
+        context._trace_span = None
+        pending.end()
+
+def _handle_error(exception_context):
+    # after_cursor_execute isn't called for a failed statement; its span ends here, with the error.
+    pending = getattr(exception_context.execution_context, "_trace_span", None)
+    if pending is not None:
+        exception_context.execution_context._trace_span = None
+        pending.end(exception_context.original_exception)
+
+def trace_engine(engine: Engine):
+    """Records a span per statement run on `engine` inside a trace (for an AsyncEngine, pass its sync_engine)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": _OTLP_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in {**span.trace.attributes, **span.attributes}.items() if value is not None],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+class SpanExporter:
+    """
+    Writes finished traces from a background thread, so requests only pay for a queue put.
+    If the queue is full (the file or collector can't keep up), traces are dropped.
+    """
+    def __init__(self, max_queued: int = 1000):
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=max_queued)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._client = None
+        self.dropped = 0
+
+    def submit(self, spans: List[Span]):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self.export(spans)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(spans)} span(s): {e}")
+            finally:
+                self._queue.task_done()
+
+    def export(self, spans: List[Span]):
+        if TRACING_EXPORTER == "otlp":
+            self._export_otlp(spans)
+        else:
+            with open(TRACING_FILE, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+
+    def _export_otlp(self, spans: List[Span]):
+        import httpx
+        if self._client is None:
+            self._client = httpx.Client(timeout=5.0)
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACING_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "healthnexus"}, "spans": [_otlp_span(span) for span in spans]}],
+        }]}
+        self._client.post(OTLP_TRACES_ENDPOINT, json=body).raise_for_status()
+
+    def flush(self, timeout: float = 5.0):
+        """Waits (up to `timeout` seconds) for queued traces to be written, e.g. on shutdown."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+exporter = SpanExporter()
@@ -19,6 +19,31 @@ document.addEventListener('DOMContentLoaded', () => {
 
         chatMessages.appendChild(messageDiv);
         chatMessages.scrollTop = chatMessages.scrollHeight; 
+        return messageDiv;
+    }
+
+    function setMessageText(messageDiv, text) {
+        messageDiv.innerHTML = text.replace(/\n/g, '<br>');
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    // Reads the Server-Sent Events of /chat/stream, calling onEvent with each parsed event.
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const dataLine = frame.split('\n').find(line => line.startsWith('data: '));
+                if (dataLine) onEvent(JSON.parse(dataLine.slice(6)));
+            }
+        }
     }
 
     async function sendMessage() {
@@ -32,11 +57,11 @@ document.addEventListener('DOMContentLoaded', () => {
             statusMessage.textContent = 'Agent is thinking...';
             statusMessage.classList.remove('error-message');
             
-            const response = await fetch('https://healthnexus-backend.onrender.com/chat/', {
+            const response = await fetch('https://healthnexus-backend.onrender.com/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'Accept': 'application/json'
+                    'Accept': 'text/event-stream'
                 },
                 body: JSON.stringify({ 
                     prompt: prompt, 
@@ -50,11 +75,27 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorData.detail || 'Server returned an error.');
             }
 
-            const data = await response.json();
-            
-            sessionId = data.session_id;
+            let agentMessage = null;
+            let streamedText = '';
+            await readEventStream(response, (event) => {
+                if (event.type === 'session') {
+                    sessionId = event.session_id;
+                } else if (event.type === 'token') {
+                    streamedText += event.text;
+                    if (!agentMessage) agentMessage = addMessage('', 'agent');
+                    setMessageText(agentMessage, streamedText);
+                } else if (event.type === 'tool_start') {
+                    // Text streamed before a tool call is the model thinking aloud; the answer comes after.
+                    streamedText = '';
+                    statusMessage.textContent = `Running ${event.tool}...`;
+                } else if (event.type === 'tool_end') {
+                    statusMessage.textContent = 'Agent is thinking...';
+                } else if (event.type === 'final') {
+                    if (!agentMessage) agentMessage = addMessage('', 'agent');
+                    setMessageText(agentMessage, event.response);
+                }
+            });
 
-            addMessage(data.response, 'agent');
             statusMessage.textContent = '';
         } catch (error) {
             console.error('Error:', error);
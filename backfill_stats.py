@@ -0,0 +1,15 @@
+# backfill_stats.py
+from backend.database import engine, init_db
+from backend.services.daily_stats import backfill
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    init_db()
+    try:
+        with engine.begin() as conn:
+            backfill(conn)
+    except Exception as e:
+        logger.error(f"An error occurred during the stats backfill: {e}")
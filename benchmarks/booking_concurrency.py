@@ -0,0 +1,121 @@
+# benchmarks/booking_concurrency.py
+"""
+Hammers one doctor's slots with concurrent book_appointment calls and reports
+throughput, conflict rate and whether any slot was double-booked.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.booking_concurrency --workers 50 --attempts 2000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from backend.database import AsyncSessionLocal, SessionLocal, async_engine, init_db
+from backend.mcp_tools.appointment_tools import book_appointment
+from backend.models import Appointment, DailyDoctorStats, Doctor, DoctorAvailability, OutboxEvent, Patient
+from backend.services.daily_stats import backfill
+
+BENCH_DOCTOR_EMAIL = "bench.doctor@clinic.com"
+SLOT_HOURS = [9, 10, 11, 12, 14, 15, 16, 17]
+
+def prepare(days: int, patients: int) -> list:
+    """Resets the benchmark doctor's schedule and returns the bookable slot strings."""
+    init_db()
+    db = SessionLocal()
+    try:
+        doctor = db.query(Doctor).filter(Doctor.email == BENCH_DOCTOR_EMAIL).first()
+        if not doctor:
+            doctor = Doctor(name="Dr. Bench Mark", specialty="Benchmarking", email=BENCH_DOCTOR_EMAIL, phone_number="000")
+            db.add(doctor)
+            db.flush()
+        appointment_ids = select(Appointment.id).where(Appointment.doctor_id == doctor.id)
+        db.execute(delete(OutboxEvent).where(OutboxEvent.appointment_id.in_(appointment_ids)))
+        db.execute(delete(Appointment).where(Appointment.doctor_id == doctor.id))
+        db.execute(delete(DoctorAvailability).where(DoctorAvailability.doctor_id == doctor.id))
+        backfill(db.connection())
+
+        slots = []
+        for offset in range(1, days + 1):
+            day = date.today() + timedelta(days=offset)
+            for hour in SLOT_HOURS:
+                start = datetime(day.year, day.month, day.day, hour)
+                slots.append(DoctorAvailability(doctor_id=doctor.id, date=day, start_time=start, end_time=start + timedelta(hours=1), is_booked=False))
+        db.add_all(slots)
+
+        existing = {email for (email,) in db.query(Patient.email).filter(Patient.email.like("bench.patient%"))}
+        db.add_all([
+            Patient(name=f"bench patient {i}", email=f"bench.patient{i}@example.com")
+            for i in range(patients) if f"bench.patient{i}@example.com" not in existing
+        ])
+        db.commit()
+        return [slot.start_time.strftime("%Y-%m-%d %H:%M:%S") for slot in slots]
+    finally:
+        db.close()
+
+async def worker(slot_strings: list, patients: int, attempts: list, stats: dict, latencies: list):
+    while attempts:
+        attempts.pop()
+        slot = random.choice(slot_strings)
+        patient_email = f"bench.patient{random.randrange(patients)}@example.com"
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            result = await book_appointment(db, patient_email, BENCH_DOCTOR_EMAIL, slot, "benchmark")
+        latencies.append(time.perf_counter() - started)
+        if result.get("status") == "success":
+            stats["booked"] += 1
+        elif "not available" in result.get("message", "") or "already exists" in result.get("message", ""):
+            stats["conflicts"] += 1
+        else:
+            stats["errors"] += 1
+
+async def verify() -> dict:
+    async with AsyncSessionLocal() as db:
+        doctor_id = await db.scalar(select(Doctor.id).where(Doctor.email == BENCH_DOCTOR_EMAIL))
+        appointments = await db.scalar(select(func.count()).select_from(Appointment).where(Appointment.doctor_id == doctor_id))
+        booked_slots = await db.scalar(select(func.count()).select_from(DoctorAvailability).where(
+            DoctorAvailability.doctor_id == doctor_id, DoctorAvailability.is_booked == True))
+        duplicate_times = await db.scalar(select(func.count()).select_from(
+            select(Appointment.appointment_time).where(Appointment.doctor_id == doctor_id)
+            .group_by(Appointment.appointment_time).having(func.count() > 1).subquery()))
+        stats_appointments = await db.scalar(select(func.coalesce(func.sum(DailyDoctorStats.appointment_count), 0)).where(
+            DailyDoctorStats.doctor_id == doctor_id))
+    return {"appointments": appointments, "booked_slots": booked_slots, "double_booked_times": duplicate_times, "stats_appointments": stats_appointments}
+
+async def run(args):
+    slot_strings = prepare(args.days, args.patients)
+    attempts = list(range(args.attempts))
+    stats = {"booked": 0, "conflicts": 0, "errors": 0}
+    latencies: list = []
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(slot_strings, args.patients, attempts, stats, latencies) for _ in range(args.workers)])
+    elapsed = time.perf_counter() - started
+    check = await verify()
+    await async_engine.dispose()
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"slots={len(slot_strings)} workers={args.workers} attempts={total} elapsed={elapsed:.2f}s")
+    print(f"booked={stats['booked']} conflicts={stats['conflicts']} errors={stats['errors']}")
+    print(f"attempts/s={total / elapsed:.1f} bookings/s={stats['booked'] / elapsed:.1f} conflict_rate={stats['conflicts'] / total:.1%}")
+    print(f"latency p50={statistics.median(latencies) * 1000:.1f}ms p95={latencies[int(total * 0.95) - 1] * 1000:.1f}ms")
+    print(f"verify: {check}")
+    if check["double_booked_times"] or check["appointments"] != stats["booked"] or check["booked_slots"] != stats["booked"]:
+        raise SystemExit("FAILED: bookings and slot state disagree (double booking or lost update).")
+    if check["stats_appointments"] != stats["booked"]:
+        raise SystemExit("FAILED: daily stats disagree with the bookings made.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--attempts", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=10, help="Days of slots to open for the benchmark doctor.")
+    parser.add_argument("--patients", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
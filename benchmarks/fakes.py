@@ -0,0 +1,168 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for the services HealthNexus talks to, so benchmarks run offline:
+a scripted chat model in place of Gemini, an in-memory Google Calendar, and asyncio
+SMTP and Slack webhook sinks that accept and count everything sent to them.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Answers like a tool-calling model, from a script instead of an LLM. When the latest
+    message is a scripted user prompt, it calls that prompt's tool; once the tool has
+    answered, it replies with the tool's output. Unscripted prompts get a plain reply.
+    """
+    script: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    latency_seconds: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        self.calls += 1
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            return AIMessage(content=f"Done. {str(last.content)[:300]}")
+        prompt = last.content if isinstance(last, HumanMessage) else ""
+        step = self.script.get(prompt)
+        if step is None:
+            return AIMessage(content="How can I help you with your appointment?")
+        tool_name, arguments = step
+        return AIMessage(content="", tool_calls=[{"name": tool_name, "args": arguments, "id": f"call_{self.calls}"}])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+class _FakeCalendarRequest:
+    def __init__(self, calendar: "FakeCalendarService", kind: str, body: dict):
+        self.calendar = calendar
+        self.kind = kind
+        self.body = body
+
+    def execute(self, http: Any = None) -> dict:
+        return self.calendar.handle(self.kind, self.body)
+
+class FakeCalendarService:
+    """The slice of the Calendar v3 client the app uses: freebusy().query() and events().insert(). Every calendar is free."""
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = {"freebusy": 0, "insert": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def handle(self, kind: str, body: dict) -> dict:
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            self.calls[kind] += 1
+        if kind == "freebusy":
+            return {"calendars": {item["id"]: {"busy": []} for item in body["items"]}}
+        return {"htmlLink": f"https://calendar.invalid/event/{next(self._ids)}"}
+
+    def freebusy(self):
+        service = self
+        class _FreeBusy:
+            def query(self, body: dict):
+                return _FakeCalendarRequest(service, "freebusy", body)
+        return _FreeBusy()
+
+    def events(self):
+        service = self
+        class _Events:
+            def insert(self, calendarId: str, body: dict):
+                return _FakeCalendarRequest(service, "insert", body)
+        return _Events()
+
+    def install(self):
+        """Routes backend.services.google_calendar through this fake."""
+        from backend.services.google_calendar import calendar_manager
+        calendar_manager.get_service = lambda: self
+        calendar_manager.execute = lambda request: request.execute()
+
+class SMTPSink:
+    """Just enough of an SMTP server to accept mail from smtplib; counts the messages."""
+    def __init__(self):
+        self.messages = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(b"220 healthnexus-sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    await reader.readuntil(b"\r\n.\r\n")
+                    self.messages += 1
+                    writer.write(b"250 OK: queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    break
+                else:
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+class WebhookSink:
+    """A bare HTTP/1.1 server answering every POST with 200, standing in for the Slack webhook."""
+    def __init__(self):
+        self.posts = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for header in head.split(b"\r\n"):
+                    name, _, value = header.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                self.posts += 1
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
@@ -0,0 +1,94 @@
+# benchmarks/import_profile.py
+"""
+Import-time profile of the app: imports the given modules in a fresh interpreter with
+`python -X importtime` and reports how long each one took, which top-level packages
+the time went to, and the slowest individual modules. Later modules only pay for what
+the earlier ones didn't already import, so listing the lazily loaded modules after
+backend.main shows what the first request to need them costs.
+
+Without DATABASE_URL, a throwaway SQLite database is used (nothing is written to it).
+
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --modules backend.main backend.agents.doctor_agent backend.services.seeder
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ("backend.main", "backend.agents.doctor_agent")
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def profile_imports(modules: List[str]) -> List[Tuple[str, int, int, int]]:
+    """Returns (module, self µs, cumulative µs, depth) for every module imported, in import order."""
+    env = dict(os.environ)
+    if not env.get("DATABASE_URL"):
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='healthnexus-imports-'), 'imports.db')}"
+    code = "; ".join(f"import {module}" for module in modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, capture_output=True, text=True, check=False,
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"Importing {', '.join(modules)} failed:\n{completed.stderr[-2000:]}")
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+def summarize(entries: List[Tuple[str, int, int, int]], modules: List[str], top: int) -> Dict[str, object]:
+    by_module = {name: (self_us, cumulative_us) for name, self_us, cumulative_us, _ in entries}
+    packages: Dict[str, Dict[str, float]] = defaultdict(lambda: {"self_ms": 0.0, "modules": 0})
+    for name, self_us, _, _ in entries:
+        package = packages[name.split(".")[0]]
+        package["self_ms"] += self_us / 1000
+        package["modules"] += 1
+    top_level = [(name, cumulative_us) for name, _, cumulative_us, depth in entries if depth == 0]
+    return {
+        "total_ms": round(sum(cumulative_us for _, cumulative_us in top_level) / 1000, 1),
+        # A module already imported by an earlier one doesn't show up again; it cost nothing extra.
+        "requested": {module: round(by_module.get(module, (0, 0))[1] / 1000, 1) for module in modules},
+        "packages": {
+            name: {"self_ms": round(stats["self_ms"], 1), "modules": int(stats["modules"])}
+            for name, stats in sorted(packages.items(), key=lambda item: item[1]["self_ms"], reverse=True)[:top]
+        },
+        "slowest_modules": [
+            {"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for name, self_us, cumulative_us, _ in sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+        ],
+    }
+
+def print_report(report: Dict[str, object]):
+    print(f"total import time: {report['total_ms']} ms")
+    print(f"\n{'module':<45}{'cumulative ms':>15}")
+    for module, cumulative_ms in report["requested"].items():
+        print(f"{module:<45}{cumulative_ms:>15}")
+    print(f"\n{'package':<45}{'self ms':>15}{'modules':>10}")
+    for name, stats in report["packages"].items():
+        print(f"{name:<45}{stats['self_ms']:>15}{stats['modules']:>10}")
+    print(f"\n{'slowest modules (self time)':<45}{'self ms':>15}{'cumul. ms':>10}")
+    for entry in report["slowest_modules"]:
+        print(f"{entry['module']:<45}{entry['self_ms']:>15}{entry['cumulative_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES), help="Modules to import, in order.")
+    parser.add_argument("--top", type=int, default=15, help="How many packages and modules to list.")
+    parser.add_argument("--json", help="Also write the report to this file.")
+    args = parser.parse_args()
+    report = summarize(profile_imports(args.modules), args.modules, args.top)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
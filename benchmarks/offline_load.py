@@ -0,0 +1,310 @@
+# benchmarks/offline_load.py
+"""
+Load test for the HTTP API without any external service: Gemini, Google Calendar,
+Gmail and Slack are replaced by the local fakes in benchmarks/fakes.py, and requests
+go to the app in-process. Runs on a throwaway SQLite database unless DATABASE_URL
+points somewhere else (use a scratch database).
+
+Scenarios:
+    booking       three-turn /chat/ conversations that find a doctor, check a day and book
+    availability  /tools/check_doctor_availability/ across doctors and days
+    reporting     doctor summaries, multi-day reports and patient counts
+
+    python -m benchmarks.offline_load --requests 300 --concurrency 20
+    python -m benchmarks.offline_load --scenarios booking --llm-latency-ms 400 --calendar-latency-ms 80
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+SCENARIOS = ("booking", "availability", "reporting")
+SPECIALTIES = ("Neurology", "Cardiology", "Dermatology", "Pediatrics")
+BENCH_DOCTOR_DOMAIN = "bench.clinic"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def configure_environment(smtp_port: int, webhook_port: int):
+    """Points the app at the local sinks. Has to run before any backend module is imported."""
+    if not os.getenv("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='healthnexus-bench-'), 'bench.db')}"
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ.update({
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_USE_SSL": "false",
+        "GMAIL_SENDER": "bench@healthnexus.invalid",
+        "GMAIL_APP_PASSWORD": "",
+        "SLACK_WEBHOOK_URL": f"http://127.0.0.1:{webhook_port}/webhook",
+        "SLACK_COALESCE_SECONDS": "0.2",
+    })
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+class QueryCounter:
+    """Counts SQL statements on the app's engines through SQLAlchemy's cursor events."""
+    def __init__(self, *engines):
+        from sqlalchemy import event
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+def prepare(num_doctors: int, num_patients: int, days: int) -> Dict[str, list]:
+    """Creates the benchmark doctors, patients and schedule, clearing earlier runs' bookings."""
+    from sqlalchemy import delete, select
+    from backend.database import SessionLocal, init_db
+    from backend.models import Appointment, Doctor, DoctorAvailability, OutboxEvent, Patient
+    from backend.services.daily_stats import backfill
+    from backend.services.seeder import seed_availabilities
+
+    init_db()
+    db = SessionLocal()
+    try:
+        existing = {email for (email,) in db.query(Doctor.email).filter(Doctor.email.like(f"%@{BENCH_DOCTOR_DOMAIN}"))}
+        db.add_all([
+            Doctor(name=f"Dr. Bench {i}", specialty=SPECIALTIES[i % len(SPECIALTIES)], email=f"doctor{i}@{BENCH_DOCTOR_DOMAIN}", phone_number="000")
+            for i in range(num_doctors) if f"doctor{i}@{BENCH_DOCTOR_DOMAIN}" not in existing
+        ])
+        db.flush()
+        doctor_ids = select(Doctor.id).where(Doctor.email.like(f"%@{BENCH_DOCTOR_DOMAIN}"))
+        appointment_ids = select(Appointment.id).where(Appointment.doctor_id.in_(doctor_ids))
+        db.execute(delete(OutboxEvent).where(OutboxEvent.appointment_id.in_(appointment_ids)))
+        db.execute(delete(Appointment).where(Appointment.doctor_id.in_(doctor_ids)))
+        db.execute(delete(DoctorAvailability).where(DoctorAvailability.doctor_id.in_(doctor_ids)))
+        backfill(db.connection())
+
+        existing = {email for (email,) in db.query(Patient.email).filter(Patient.email.like("bench.patient%"))}
+        db.add_all([
+            Patient(name=f"bench patient {i}", email=f"bench.patient{i}@example.com")
+            for i in range(num_patients) if f"bench.patient{i}@example.com" not in existing
+        ])
+        db.commit()
+        seed_availabilities(db, days)
+
+        doctors = sorted(email for (email,) in db.query(Doctor.email).filter(Doctor.email.like(f"%@{BENCH_DOCTOR_DOMAIN}")))
+        slots = [
+            (email, start_time.strftime("%Y-%m-%d %H:%M:%S"))
+            for email, start_time in db.query(Doctor.email, DoctorAvailability.start_time)
+            .join(DoctorAvailability, DoctorAvailability.doctor_id == Doctor.id)
+            .filter(Doctor.email.like(f"%@{BENCH_DOCTOR_DOMAIN}"), DoctorAvailability.date > date.today())
+            .order_by(DoctorAvailability.start_time, Doctor.email)
+        ]
+        return {"doctors": doctors, "slots": slots}
+    finally:
+        db.close()
+
+class Scenario:
+    """Runs `requests` requests, at most `concurrency` at a time, and records per-request latency."""
+    def __init__(self, name: str, queries: QueryCounter):
+        self.name = name
+        self.queries = queries
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    async def timed(self, request: Awaitable) -> Optional[dict]:
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+            body = response.json() if ok else None
+        except Exception as e:
+            print(f"[{self.name}] request failed: {e}", file=sys.stderr)
+            ok, body = False, None
+        self.latencies.append(time.perf_counter() - started)
+        if not ok:
+            self.errors += 1
+        return body
+
+    async def run(self, jobs: List[Callable[[], Awaitable[None]]], concurrency: int) -> dict:
+        pending = iter(jobs)
+
+        async def worker():
+            for job in pending:
+                await job()
+
+        queries_before = self.queries.count
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(jobs))))))
+        elapsed = time.perf_counter() - started
+        queries = self.queries.count - queries_before
+
+        latencies = sorted(self.latencies)
+        total = len(latencies)
+        return {
+            "scenario": self.name,
+            "requests": total,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "queries": queries,
+            "queries_per_request": round(queries / total, 2) if total else 0.0,
+        }
+
+def booking_jobs(client, scenario: Scenario, model, data: dict, requests: int) -> List[Callable[[], Awaitable[None]]]:
+    conversations = min(max(1, requests // 3), len(data["slots"]))
+    slots = random.sample(data["slots"], conversations)
+
+    def conversation(index: int, doctor_email: str, appointment_time: str):
+        patient_email = f"bench.patient{index}@example.com"
+        day = appointment_time[:10]
+        turns = [
+            (f"Hi, I am {patient_email} and I would like to see a specialist, conversation {index}.",
+             ("get_doctor_details_by_name", {"doctor_name": f"Dr. Bench {doctor_email.split('@')[0][len('doctor'):]}"})),
+            (f"What times does that doctor have on {day}? (conversation {index})",
+             ("check_doctor_availability", {"doctor_name_or_email": doctor_email, "target_date_str": day})),
+            (f"Please book {appointment_time[11:16]} for me, reason: benchmark (conversation {index}).",
+             ("book_appointment", {"patient_email": patient_email, "doctor_email": doctor_email, "appointment_time_str": appointment_time, "reason": "benchmark"})),
+        ]
+
+        async def job():
+            session_id = None
+            for prompt, step in turns:
+                model.script[prompt] = step
+                body = await scenario.timed(client.post("/chat/", json={"prompt": prompt, "role": "patient", "session_id": session_id}))
+                session_id = (body or {}).get("session_id", session_id)
+        return job
+
+    return [conversation(i, doctor_email, appointment_time) for i, (doctor_email, appointment_time) in enumerate(slots)]
+
+def availability_jobs(client, scenario: Scenario, data: dict, requests: int, days: int) -> List[Callable[[], Awaitable[None]]]:
+    def job_for(doctor_email: str, day: str):
+        async def job():
+            await scenario.timed(client.get("/tools/check_doctor_availability/", params={"doctor_name_or_email": doctor_email, "target_date_str": day}))
+        return job
+    return [
+        job_for(random.choice(data["doctors"]), (date.today() + timedelta(days=random.randrange(1, days + 1))).isoformat())
+        for _ in range(requests)
+    ]
+
+def reporting_jobs(client, scenario: Scenario, data: dict, requests: int, days: int) -> List[Callable[[], Awaitable[None]]]:
+    def job_for(kind: int):
+        day = (date.today() + timedelta(days=random.randrange(1, days + 1))).isoformat()
+        if kind == 0:
+            request = lambda: client.get("/tools/get_appointments_summary_for_doctor/", params={"doctor_email": random.choice(data["doctors"]), "target_date_str": day})
+        elif kind == 1:
+            request = lambda: client.get("/tools/get_appointments_report/", params={
+                "start_date_str": date.today().isoformat(),
+                "end_date_str": (date.today() + timedelta(days=days)).isoformat(),
+                "specialty": random.choice(SPECIALTIES),
+            })
+        else:
+            request = lambda: client.get("/tools/get_patient_count_by_date/", params={"target_date_str": day})
+
+        async def job():
+            await scenario.timed(request())
+        return job
+    return [job_for(i % 3) for i in range(requests)]
+
+async def wait_for_outbox(timeout: float = 30.0):
+    """Waits until the outbox has delivered the bookings' emails and calendar events."""
+    from sqlalchemy import func, select
+    from backend.database import AsyncSessionLocal
+    from backend.models import OutboxEvent
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        async with AsyncSessionLocal() as db:
+            pending = await db.scalar(select(func.count()).select_from(OutboxEvent).where(OutboxEvent.status.in_(("pending", "processing"))))
+        if not pending:
+            return
+        await asyncio.sleep(0.2)
+    print(f"outbox still has {pending} undelivered events after {timeout:.0f}s", file=sys.stderr)
+
+async def run(args) -> List[dict]:
+    from benchmarks.fakes import FakeCalendarService, ScriptedChatModel, SMTPSink, WebhookSink
+
+    smtp_port, webhook_port = _free_port(), _free_port()
+    configure_environment(smtp_port, webhook_port)
+    smtp_sink, webhook_sink = SMTPSink(), WebhookSink()
+    await smtp_sink.start("127.0.0.1", smtp_port)
+    await webhook_sink.start("127.0.0.1", webhook_port)
+
+    import httpx
+    from backend import main
+    from backend.agents import doctor_agent
+    from backend.database import async_engine, engine
+
+    model = ScriptedChatModel(latency_seconds=args.llm_latency_ms / 1000)
+    doctor_agent._shared_llm = lambda: model
+    calendar = FakeCalendarService(latency_seconds=args.calendar_latency_ms / 1000)
+    calendar.install()
+
+    data = await asyncio.to_thread(prepare, args.doctors, args.patients, args.days)
+    queries = QueryCounter(engine, async_engine.sync_engine)
+    await main.startup_event()
+
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in args.scenarios:
+                scenario = Scenario(name, queries)
+                if name == "booking":
+                    jobs = booking_jobs(client, scenario, model, data, args.requests)
+                elif name == "availability":
+                    jobs = availability_jobs(client, scenario, data, args.requests, args.days)
+                else:
+                    jobs = reporting_jobs(client, scenario, data, args.requests, args.days)
+                llm_calls_before = model.calls
+                result = await scenario.run(jobs, args.concurrency)
+                result["llm_calls"] = model.calls - llm_calls_before
+                results.append(result)
+        await wait_for_outbox()
+    finally:
+        await main.shutdown_event()
+        await async_engine.dispose()
+        await smtp_sink.stop()
+        await webhook_sink.stop()
+
+    print(f"database: {os.environ['DATABASE_URL']}")
+    print(f"{'scenario':<13}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'q/req':>7}{'llm':>6}")
+    for result in results:
+        print(
+            f"{result['scenario']:<13}{result['requests']:>9}{result['errors']:>8}{result['throughput_rps']:>9}"
+            f"{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}{result['queries']:>9}"
+            f"{result['queries_per_request']:>7}{result['llm_calls']:>6}"
+        )
+    print(f"sinks: emails={smtp_sink.messages} slack_posts={webhook_sink.posts} calendar={calendar.calls}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "emails": smtp_sink.messages, "slack_posts": webhook_sink.posts, "calendar": calendar.calls}, f, indent=2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario (booking: three per conversation).")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--days", type=int, default=7, help="Days of availability to seed.")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Simulated latency of each chat model call.")
+    parser.add_argument("--calendar-latency-ms", type=float, default=0, help="Simulated latency of each Calendar API call.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the request mix.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()